@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""Batch grading of Assignment4 submissions.
+
+Runs every ``Assignment4/<Student>/task06.py`` and ``task07.py`` in its own
+forked worker process, using the ``Report`` class from the ``validation.py``
+next to this file, and writes one combined report.
+
+The reference graphs (``rdf/data06.ttl``) are parsed once in the parent
+process. Workers are forked, so they inherit the parsed graphs copy-on-write
+and never touch the network: ``urlretrieve`` of ``validation.py`` becomes a
+no-op and ``Graph.parse`` of a course RDF file is served from memory.
+
+Each ``Report`` streams its check results to a JSON Lines file in the
+worker's scratch folder (see ``validation.JSONL_ENV``); the grader merges
+them into the combined report.
+
+Usage:
+    python batch_grading.py [--root Assignment4] [--workers 8] [--timeout 60]
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import multiprocessing
+import os
+import re
+import runpy
+import shutil
+import sys
+import tempfile
+import time
+import traceback
+import urllib.request
+from multiprocessing.connection import wait
+
+from rdflib import Graph
+
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+COURSE_MATERIALS = os.path.dirname(PYTHON_DIR)
+ASSIGNMENT_ROOT = os.path.dirname(COURSE_MATERIALS)
+RDF_DIR = os.path.join(COURSE_MATERIALS, "rdf")
+
+# Workers must use this validation.py, not the copy in each student folder
+sys.path.insert(0, PYTHON_DIR)
+import validation  # noqa: E402
+from rdf_snapshot import load_graph  # noqa: E402
+
+# Same selection as the "Check Homework Report" workflow
+TASK_PATTERN = re.compile(r"^task0*(6|7)\.py$", re.IGNORECASE)
+REFERENCE_FILES = ("data06.ttl",)
+
+# Filled in by the parent before forking, inherited by the workers
+_REFERENCE_GRAPHS = {}
+
+
+def load_reference_graphs(names=REFERENCE_FILES):
+    graphs = {}
+    for name in names:
+        graphs[name] = load_graph(os.path.join(RDF_DIR, name))
+    return graphs
+
+
+def find_submissions(root=ASSIGNMENT_ROOT):
+    submissions = []
+    for student in sorted(os.listdir(root)):
+        folder = os.path.join(root, student)
+        if student == "course_materials" or not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            match = TASK_PATTERN.match(name)
+            if match:
+                submissions.append({
+                    "student": student,
+                    "task": "task0" + match.group(1),
+                    "script": os.path.join(folder, name),
+                })
+    return submissions
+
+
+def _no_download(url, filename=None, *args, **kwargs):
+    # validation.py is already imported from PYTHON_DIR
+    return filename, None
+
+
+def _install_offline_hooks():
+    original_parse = Graph.parse
+
+    def parse(self, source=None, *args, **kwargs):
+        if isinstance(source, str):
+            name = source.rstrip("/").rsplit("/", 1)[-1]
+            if name in _REFERENCE_GRAPHS:
+                self += _REFERENCE_GRAPHS[name]
+                return self
+        return original_parse(self, source, *args, **kwargs)
+
+    Graph.parse = parse
+    urllib.request.urlretrieve = _no_download
+
+
+def _run_submission(submission, conn):
+    workdir = tempfile.mkdtemp(prefix="grading_")
+    os.chdir(workdir)
+    os.environ[validation.JSONL_ENV] = os.path.join(workdir, "checks.jsonl")
+    _install_offline_hooks()
+    output = io.StringIO()
+    error = None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+            runpy.run_path(submission["script"], run_name="__main__")
+    except SystemExit:
+        pass
+    except BaseException as e:
+        error = "".join(traceback.format_exception_only(type(e), e)).strip()
+    elapsed = time.perf_counter() - start
+
+    report = ""
+    checks = []
+    for name in sorted(os.listdir(workdir)):
+        if name.startswith("report_result") and name.endswith(".txt"):
+            with open(os.path.join(workdir, name), encoding="utf-8") as f:
+                report += f.read()
+        elif name == "checks.jsonl":
+            with open(os.path.join(workdir, name), encoding="utf-8") as f:
+                checks = [json.loads(line) for line in f]
+    shutil.rmtree(workdir, ignore_errors=True)
+    conn.send(_result(submission, error, report, elapsed, checks))
+    conn.close()
+
+
+def _result(submission, error, report, elapsed, checks=()):
+    if error is not None:
+        status = "crash"
+    elif not report:
+        status = "no report"
+    elif "ERROR" in report:
+        status = "fail"
+    else:
+        status = "ok"
+    return dict(submission, status=status, error=error, report=report,
+                seconds=round(elapsed, 3), checks=list(checks))
+
+
+def grade_all(submissions, workers=None, timeout=60):
+    """Grade submissions in parallel, at most ``workers`` at a time, killing
+    any worker that runs for longer than ``timeout`` seconds."""
+    ctx = multiprocessing.get_context("fork")
+    workers = workers or os.cpu_count() or 1
+    pending = list(submissions)
+    running = {}
+    results = []
+
+    # Keep the reference graphs out of the GC's way so forked pages stay shared
+    gc.collect()
+    gc.freeze()
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                submission = pending.pop(0)
+                reader, writer = ctx.Pipe(duplex=False)
+                process = ctx.Process(target=_run_submission, args=(submission, writer), daemon=True)
+                process.start()
+                writer.close()
+                running[reader] = (submission, process, time.monotonic())
+
+            next_deadline = min(started for _, _, started in running.values()) + timeout
+            for reader in wait(list(running), timeout=max(0, next_deadline - time.monotonic())):
+                submission, process, started = running.pop(reader)
+                try:
+                    results.append(reader.recv())
+                except EOFError:
+                    results.append(_result(submission, "worker exited with code " + str(process.exitcode),
+                                           "", time.monotonic() - started))
+                reader.close()
+                process.join()
+
+            now = time.monotonic()
+            for reader, (submission, process, started) in list(running.items()):
+                if now - started >= timeout:
+                    process.kill()
+                    process.join()
+                    reader.close()
+                    del running[reader]
+                    result = _result(submission, None, "", now - started)
+                    result["status"] = "timeout"
+                    results.append(result)
+    finally:
+        gc.unfreeze()
+
+    results.sort(key=lambda r: (r["student"], r["task"]))
+    return results
+
+
+def save_combined_report(results, path):
+    summary = {}
+    slowest = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+        for c in r["checks"]:
+            slowest[c["check"]] = max(slowest.get(c["check"], 0), c["seconds"])
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"summary": summary, "slowest_check_seconds": slowest, "results": results},
+                  f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def save_checks_jsonl(results, path):
+    # One line per check and submission, easy to concatenate across runs
+    with open(path, "w", encoding="utf-8") as f:
+        for r in results:
+            for c in r["checks"]:
+                f.write(json.dumps(dict(c, student=r["student"], script=r["script"]),
+                                   ensure_ascii=False) + "\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Grade every Assignment4 task06/task07 submission")
+    parser.add_argument("--root", default=ASSIGNMENT_ROOT, help="folder containing the student folders")
+    parser.add_argument("--workers", type=int, default=None, help="parallel workers (default: CPU count)")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per script")
+    parser.add_argument("--output", default="grading_report.json", help="combined report file")
+    parser.add_argument("--checks", default="grading_checks.jsonl", help="per-check results file")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    _REFERENCE_GRAPHS.update(load_reference_graphs())
+    submissions = find_submissions(args.root)
+    results = grade_all(submissions, workers=args.workers, timeout=args.timeout)
+    summary = save_combined_report(results, args.output)
+    save_checks_jsonl(results, args.checks)
+
+    for r in results:
+        print(r["status"].ljust(10), r["student"], r["task"], "%.2fs" % r["seconds"])
+    print("Graded %d scripts in %.2fs: %s" % (len(results), time.perf_counter() - start,
+                                              ", ".join("%s=%d" % kv for kv in sorted(summary.items()))))
+    print("Combined report written to " + args.output + ", per-check results to " + args.checks)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Local cache for the remote files used by the course tasks.
+
+The tasks read their RDF files (and ``validation.py``) from
+raw.githubusercontent.com. ``cached_parse`` and ``cached_retrieve`` keep a
+copy of every downloaded file in a content-addressed store on disk:
+
+    ~/.cache/linked-data-course/index.json       url -> etag, sha256, fetched
+    ~/.cache/linked-data-course/objects/<sha256>.<ext>
+
+A cached copy is reused without touching the network for ``CACHE_TTL``
+seconds, after that it is revalidated with its ETag. In offline mode (or when
+the network is not reachable) the files of this repository and branch are
+served from the checkout, and anything else from the cache; a file with no
+local copy is still downloaded.
+
+The checkout is ``COURSE_CHECKOUT`` if set, otherwise the first folder holding
+``Assignment4/course_materials`` above the running script, above this module
+or above the current directory, so a copy of this module downloaded next to a
+task still finds it.
+
+Environment variables:
+    COURSE_CACHE_DIR   cache folder (default ~/.cache/linked-data-course)
+    COURSE_CACHE_TTL   seconds before a cached file is revalidated (default 86400)
+    COURSE_OFFLINE     set to 1 to prefer local copies over the network
+    COURSE_CHECKOUT    root folder of a checkout of this repository
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+CACHE_DIR = os.environ.get("COURSE_CACHE_DIR",
+                           os.path.join(os.path.expanduser("~"), ".cache", "linked-data-course"))
+CACHE_TTL = float(os.environ.get("COURSE_CACHE_TTL", 24 * 60 * 60))
+OFFLINE = os.environ.get("COURSE_OFFLINE", "") not in ("", "0")
+
+# Repository and branch this checkout corresponds to
+REPOSITORY_URL = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/"
+BRANCH = "master"
+# URL path prefix -> folder of the checkout holding those files
+CHECKOUT_FOLDERS = {
+    "Assignment4/course_materials/": ("Assignment4", "course_materials"),
+    "Assignment4/resources/": ("Assignment4", "course_materials", "rdf"),
+}
+
+
+def find_checkout():
+    """Return the root folder of a checkout of this repository, or None."""
+    if os.environ.get("COURSE_CHECKOUT"):
+        return os.environ["COURSE_CHECKOUT"]
+    script = getattr(sys.modules.get("__main__"), "__file__", None)
+    starts = [os.path.abspath(__file__), os.getcwd()]
+    if script:
+        starts.insert(0, os.path.abspath(script))
+    for folder in starts:
+        while True:
+            if os.path.isdir(os.path.join(folder, "Assignment4", "course_materials")):
+                return folder
+            parent = os.path.dirname(folder)
+            if parent == folder:
+                break
+            folder = parent
+    return None
+
+
+def checkout_path(url):
+    # Map a URL of this repository and branch to the local file; other course
+    # years and branches may hold different files and are never mapped
+    for ref in (BRANCH + "/", "refs/heads/" + BRANCH + "/"):
+        if url.startswith(REPOSITORY_URL + ref):
+            path = url[len(REPOSITORY_URL + ref):].split("?", 1)[0]
+            break
+    else:
+        return None
+    for prefix, folder in CHECKOUT_FOLDERS.items():
+        if path.startswith(prefix):
+            relative = path[len(prefix):]
+            break
+    else:
+        return None
+    checkout = find_checkout()
+    if checkout is None:
+        return None
+    path = os.path.join(checkout, *folder, *relative.split("/"))
+    if os.path.isfile(path):
+        return path
+    return None
+
+
+def _load_index():
+    try:
+        with open(os.path.join(CACHE_DIR, "index.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_index(index):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, os.path.join(CACHE_DIR, "index.json"))
+
+
+def _object_path(entry):
+    return os.path.join(CACHE_DIR, "objects", entry["sha256"] + entry["ext"])
+
+
+def _cached_path(entry):
+    if entry is not None and os.path.isfile(_object_path(entry)):
+        return _object_path(entry)
+    return None
+
+
+def _store(url, content, etag):
+    digest = hashlib.sha256(content).hexdigest()
+    ext = os.path.splitext(url.split("?", 1)[0])[1]
+    entry = {"etag": etag, "sha256": digest, "ext": ext, "fetched": time.time()}
+    path = _object_path(entry)
+    if not os.path.isfile(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+    return entry
+
+
+def fetch(url, offline=None):
+    """Return a local file path with the content of ``url``."""
+    if offline is None:
+        offline = OFFLINE
+    if not url.startswith(("http://", "https://")):
+        return url
+    index = _load_index()
+    entry = index.get(url)
+    cached = _cached_path(entry)
+    if offline:
+        local = checkout_path(url) or cached
+        if local is not None:
+            return local
+        # No local copy: download it after all
+    elif cached is not None and time.time() - entry["fetched"] < CACHE_TTL:
+        return cached
+
+    request = urllib.request.Request(url)
+    if cached is not None and entry.get("etag"):
+        request.add_header("If-None-Match", entry["etag"])
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            entry = _store(url, response.read(), response.headers.get("ETag"))
+    except urllib.error.HTTPError as e:
+        if e.code != 304:
+            raise
+        entry = dict(entry, fetched=time.time())
+    except (urllib.error.URLError, OSError):
+        # No network: fall back to whatever copy we have
+        local = checkout_path(url) or cached
+        if local is None:
+            raise
+        return local
+    index[url] = entry
+    _save_index(index)
+    return _object_path(entry)
+
+
+def cached_parse(g, url, format=None, offline=None):
+    """Drop-in for ``g.parse(url, format=...)`` going through the cache."""
+    path = fetch(url, offline=offline)
+    try:
+        from rdf_snapshot import load_graph
+    except ImportError:  # downloaded on its own, without the snapshot module
+        return g.parse(path, format=format)
+    return load_graph(path, format=format, graph=g)
+
+
+def cached_retrieve(url, filename, offline=None):
+    """Drop-in for ``urllib.request.urlretrieve(url, filename)``."""
+    path = fetch(url, offline=offline)
+    if os.path.abspath(path) != os.path.abspath(filename):
+        shutil.copyfile(path, filename)
+    return filename, None
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Run the set-up of the task06/task07 templates the way a submission is checked.
+
+Each template is copied, with ``validation.py``, into a submission folder
+(``Assignment4/<folder>/``) of a scratch copy of the repository layout, its
+Colab magics are commented out (step 5 of the README) and it is run as
+``python Assignment4/<folder>/task0N.py`` from the scratch root, as the
+"Check Homework Report" workflow does. The exercises are unsolved in the
+templates (the placeholder queries of task07 do not even parse), so only the
+set-up cells are run: imports, downloading ``validation.py``, loading the RDF
+file and creating the ``Report``. The check fails if any of them fails.
+
+With ``--offline`` the course URLs are answered from this checkout instead of
+raw.githubusercontent.com, through a ``sitecustomize`` module; nothing is
+added to the template's ``sys.path``, so its imports resolve as in CI.
+
+Usage:
+    python check_templates.py [--offline] [--timeout 120]
+"""
+
+import argparse
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PYTHON_DIR = os.path.dirname(os.path.abspath(__file__))
+COURSE_MATERIALS = os.path.dirname(PYTHON_DIR)
+CHECKOUT = os.path.dirname(os.path.dirname(COURSE_MATERIALS))
+
+TEMPLATES = ("task06.py", "task07.py")
+# Last line of the set-up cells of a template
+SETUP_END = re.compile(r"(?m)^\w+ = Report\(\)\n")
+SUBMISSION_FOLDER = "Template_Check_0000"
+
+# Loaded by the template's interpreter in offline mode
+OFFLINE_HOOKS = '''
+import importlib.util
+import urllib.request
+
+from rdflib import Graph
+from rdflib.util import guess_format
+
+_spec = importlib.util.spec_from_file_location("_course_loader", {loader!r})
+_loader = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(_loader)
+_parse = Graph.parse
+
+
+def _local(url):
+    path = _loader.checkout_path(url) if isinstance(url, str) else None
+    if path is None:
+        raise OSError("No copy of " + str(url) + " in the checkout")
+    return path
+
+
+def _urlretrieve(url, filename=None, *args, **kwargs):
+    with open(_local(url), "rb") as src, open(filename, "wb") as dst:
+        dst.write(src.read())
+    return filename, None
+
+
+def _graph_parse(self, source=None, *args, **kwargs):
+    if isinstance(source, str) and source.startswith(("http://", "https://")):
+        source = _local(source)
+        # rdflib falls back to the URL suffix for unknown formats ("TTL")
+        kwargs["format"] = guess_format(source)
+    return _parse(self, source, *args, **kwargs)
+
+
+urllib.request.urlretrieve = _urlretrieve
+Graph.parse = _graph_parse
+'''
+
+
+def as_submission(template):
+    """Set-up cells of ``template`` as a student would submit them."""
+    with open(template, encoding="utf-8") as f:
+        source = f.read()
+    end = SETUP_END.search(source)
+    if end is None:
+        raise ValueError(template + " does not create a Report")
+    # README step 5: comment the python magics out
+    return re.sub(r"(?m)^!", "#!", source[:end.end()])
+
+
+def prepare(root, offline):
+    """Lay out ``root`` like a checkout with one submission folder."""
+    assignment = os.path.join(root, "Assignment4")
+    folder = os.path.join(assignment, SUBMISSION_FOLDER)
+    os.makedirs(folder)
+    os.symlink(COURSE_MATERIALS, os.path.join(assignment, "course_materials"))
+    shutil.copy(os.path.join(PYTHON_DIR, "validation.py"), folder)
+    for name in TEMPLATES:
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(as_submission(os.path.join(PYTHON_DIR, name)))
+
+    env = dict(os.environ)
+    env.pop("PYTHONPATH", None)
+    if offline:
+        hooks = os.path.join(root, "hooks")
+        os.makedirs(hooks)
+        with open(os.path.join(hooks, "sitecustomize.py"), "w", encoding="utf-8") as f:
+            f.write(OFFLINE_HOOKS.format(loader=os.path.join(PYTHON_DIR, "cached_loader.py")))
+        env["PYTHONPATH"] = hooks
+        env["COURSE_CHECKOUT"] = CHECKOUT
+    return env
+
+
+def run_template(root, name, env, timeout):
+    """Run one template from ``root``; return an error message or None."""
+    script = "/".join(("Assignment4", SUBMISSION_FOLDER, name))
+    try:
+        process = subprocess.run([sys.executable, script], cwd=root, env=env, timeout=timeout,
+                                 stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    except subprocess.TimeoutExpired:
+        return "timed out after %s s" % timeout
+    if process.returncode != 0:
+        return "exit status %d\n%s" % (process.returncode, process.stdout[-2000:])
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--offline", action="store_true",
+                        help="serve the course URLs from this checkout")
+    parser.add_argument("--timeout", type=float, default=120,
+                        help="seconds allowed for each template")
+    args = parser.parse_args(argv)
+
+    root = tempfile.mkdtemp(prefix="template_check_")
+    failed = 0
+    try:
+        env = prepare(root, args.offline)
+        for name in TEMPLATES:
+            error = run_template(root, name, env, args.timeout)
+            print("%-10s %s" % (name, "ok" if error is None else "FAILED: " + error))
+            failed += error is not None
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
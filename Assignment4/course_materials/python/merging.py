@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""Filling missing property values of one graph from another (Task 08).
+
+``fill_missing`` indexes the donor graph by (subject, property) once, finds
+every (subject, property) pair the target graph lacks with a single set
+difference, and inserts all the fills with one ``addN`` call.
+
+Example (complete given name, family name and email of every Person):
+
+    from rdflib import Namespace, URIRef
+    VCARD = Namespace("http://www.w3.org/2001/vcard-rdf/3.0#")
+    report = fill_missing(g1, g2, [VCARD.Given, VCARD.Family, VCARD.EMAIL],
+                          rdf_type=URIRef("http://data.org#Person"))
+"""
+
+from rdflib.namespace import RDF
+
+FIRST = "first"
+ALL = "all"
+
+
+def index_by_subject_property(g, properties, subjects=None):
+    index = {}
+    for p in properties:
+        for s, o in g.subject_objects(predicate=p):
+            if subjects is None or s in subjects:
+                index.setdefault((s, p), set()).add(o)
+    return index
+
+
+def fill_missing(target, donor, properties, rdf_type=None, policy=FIRST):
+    """Add to ``target`` the values of ``properties`` it is missing, taken from ``donor``.
+
+    Only subjects of ``rdf_type`` in the target are completed (every subject
+    having one of the properties if ``rdf_type`` is None). When the donor has
+    several values for a missing pair, ``policy`` decides: ``"first"`` adds
+    the lowest value in term order, ``"all"`` adds all of them. Values present
+    in both graphs are never changed; disagreements are reported as conflicts.
+
+    Returns a dict with the ``filled`` triples, the ``conflicts`` as
+    (subject, property, target values, donor values) and the pairs still
+    ``missing`` because the donor does not have them either."""
+    if policy not in (FIRST, ALL):
+        raise ValueError("policy must be 'first' or 'all'")
+    if rdf_type is not None:
+        subjects = set(target.subjects(predicate=RDF.type, object=rdf_type))
+    else:
+        subjects = {s for p in properties for s in target.subjects(predicate=p)}
+
+    present = index_by_subject_property(target, properties, subjects)
+    available = index_by_subject_property(donor, properties, subjects)
+    wanted = {(s, p) for s in subjects for p in properties}
+    gaps = wanted - present.keys()
+
+    filled = []
+    missing = []
+    for s, p in sorted(gaps):
+        values = sorted(available.get((s, p), ()))
+        if not values:
+            missing.append((s, p))
+            continue
+        for o in values if policy == ALL else values[:1]:
+            filled.append((s, p, o))
+    target.addN((s, p, o, target) for s, p, o in filled)
+
+    conflicts = [(s, p, sorted(present[(s, p)]), sorted(available[(s, p)]))
+                 for s, p in sorted(present.keys() & available.keys())
+                 if present[(s, p)] != available[(s, p)]]
+    return {"filled": filled, "conflicts": conflicts, "missing": missing}
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+"""Pre-parsed binary snapshots of RDF files.
+
+Parsing Turtle or RDF/XML with rdflib is slow compared to rebuilding a graph
+from its terms. A snapshot stores a parsed ``Graph`` as
+
+    header    magic, format version, source size / mtime / sha256, counts
+    strings   one UTF-8 blob plus an offset array (every string stored once)
+    terms     kind byte + string ids per distinct term
+    triples   flat uint32 array of term ids (s, p, o, s, p, o, ...)
+    prefixes  (prefix, namespace) string id pairs
+
+and is read back with a single ``read`` call. ``load_graph`` accepts ``.ttl``,
+``.rdf``, ``.nt`` (any format rdflib can guess), a URL (through
+``cached_loader``) or a ``.rdfsnap`` file, and keeps the snapshot of each
+source in ``<cache>/snapshots``. A snapshot is rebuilt automatically when its
+source file changes.
+"""
+
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.util import guess_format
+
+import cached_loader
+
+MAGIC = b"RDFSNAP\0"
+VERSION = 1
+SUFFIX = ".rdfsnap"
+SNAPSHOT_DIR = os.path.join(cached_loader.CACHE_DIR, "snapshots")
+
+# magic, version, source size, source mtime_ns, source sha256,
+# strings blob length, #strings, #terms, #triples, #prefixes
+HEADER = struct.Struct("<8sHQQ32sQIIII")
+
+URI, BLANK, PLAIN, TYPED, TAGGED = range(5)
+
+
+def _uint32(values=()):
+    a = array("I", values)
+    assert a.itemsize == 4
+    return a
+
+
+def _little_endian(a):
+    if sys.byteorder == "big":
+        a.byteswap()
+    return a
+
+
+def _source_fingerprint(path, digest=True):
+    st = os.stat(path)
+    sha = b"\0" * 32
+    if digest:
+        with open(path, "rb") as f:
+            sha = hashlib.sha256(f.read()).digest()
+    return st.st_size, st.st_mtime_ns, sha
+
+
+def dumps(g, fingerprint=(0, 0, b"\0" * 32)):
+    """Serialize ``g`` to snapshot bytes."""
+    strings = {}
+    terms = {}
+    term_records = _uint32()
+    kinds = bytearray()
+
+    def string_id(s):
+        i = strings.get(s)
+        if i is None:
+            i = strings[s] = len(strings)
+        return i
+
+    def term_id(t):
+        i = terms.get(t)
+        if i is None:
+            i = terms[t] = len(terms)
+            if isinstance(t, URIRef):
+                kind, extra = URI, ""
+            elif isinstance(t, BNode):
+                kind, extra = BLANK, ""
+            elif t.language is not None:
+                kind, extra = TAGGED, t.language
+            elif t.datatype is not None:
+                kind, extra = TYPED, str(t.datatype)
+            else:
+                kind, extra = PLAIN, ""
+            kinds.append(kind)
+            term_records.append(string_id(str(t)))
+            term_records.append(string_id(extra))
+        return i
+
+    triples = _uint32()
+    for s, p, o in g:
+        triples.append(term_id(s))
+        triples.append(term_id(p))
+        triples.append(term_id(o))
+
+    prefixes = _uint32()
+    for prefix, namespace in g.namespace_manager.namespaces():
+        prefixes.append(string_id(prefix))
+        prefixes.append(string_id(str(namespace)))
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = _uint32([0])
+    for e in encoded:
+        offsets.append(offsets[-1] + len(e))
+    blob = b"".join(encoded)
+    blob += b"\0" * (-len(blob) % 4)  # keep the arrays that follow aligned
+
+    size, mtime_ns, sha = fingerprint
+    header = HEADER.pack(MAGIC, VERSION, size, mtime_ns, sha, len(blob),
+                         len(strings), len(terms), len(triples) // 3, len(prefixes) // 2)
+    kinds += b"\0" * (-len(kinds) % 4)
+    return b"".join([header, _little_endian(offsets).tobytes(), blob, bytes(kinds),
+                     _little_endian(term_records).tobytes(), _little_endian(triples).tobytes(),
+                     _little_endian(prefixes).tobytes()])
+
+
+def read_header(data):
+    fields = HEADER.unpack_from(data)
+    if fields[0] != MAGIC:
+        raise ValueError("Not an RDF snapshot")
+    return fields
+
+
+def loads(data, graph=None):
+    """Add the triples of snapshot bytes ``data`` to ``graph`` (or a new Graph)."""
+    view = memoryview(data)
+    (_, version, _, _, _, blob_len, n_strings, n_terms,
+     n_triples, n_prefixes) = read_header(view)
+    if version != VERSION:
+        raise ValueError("Unsupported snapshot version %d" % version)
+
+    def take(offset, count):
+        a = _uint32()
+        a.frombytes(view[offset:offset + 4 * count])
+        return _little_endian(a), offset + 4 * count
+
+    pos = HEADER.size
+    offsets, pos = take(pos, n_strings + 1)
+    blob = bytes(view[pos:pos + offsets[-1]])
+    pos += blob_len
+    strings = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(n_strings)]
+    kinds = view[pos:pos + n_terms]
+    pos += n_terms + (-n_terms % 4)
+    records, pos = take(pos, 2 * n_terms)
+    triples, pos = take(pos, 3 * n_triples)
+    prefixes, pos = take(pos, 2 * n_prefixes)
+
+    terms = []
+    for i in range(n_terms):
+        value, extra = strings[records[2 * i]], strings[records[2 * i + 1]]
+        kind = kinds[i]
+        if kind == URI:
+            terms.append(URIRef(value))
+        elif kind == BLANK:
+            terms.append(BNode(value))
+        elif kind == TAGGED:
+            terms.append(Literal(value, lang=extra))
+        elif kind == TYPED:
+            terms.append(Literal(value, datatype=URIRef(extra)))
+        else:
+            terms.append(Literal(value))
+
+    g = Graph() if graph is None else graph
+    for i in range(0, 2 * n_prefixes, 2):
+        g.namespace_manager.bind(strings[prefixes[i]], strings[prefixes[i + 1]], override=False)
+    g.addN((terms[triples[i]], terms[triples[i + 1]], terms[triples[i + 2]], g)
+           for i in range(0, 3 * n_triples, 3))
+    return g
+
+
+def snapshot_path(source):
+    key = hashlib.sha256(os.path.abspath(source).encode("utf-8")).hexdigest()[:24]
+    return os.path.join(SNAPSHOT_DIR, os.path.basename(source) + "." + key + SUFFIX)
+
+
+def _is_fresh(data, source):
+    try:
+        _, version, size, mtime_ns, sha, *_ = read_header(data)
+    except (ValueError, struct.error):
+        return False
+    if version != VERSION:
+        return False
+    current_size, current_mtime, _ = _source_fingerprint(source, digest=False)
+    if (size, mtime_ns) == (current_size, current_mtime):
+        return True
+    # Touched (e.g. by a checkout) but possibly unchanged
+    return size == current_size and sha == _source_fingerprint(source)[2]
+
+
+def write_snapshot(g, source, path=None):
+    path = path or snapshot_path(source)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=SUFFIX)
+    with os.fdopen(fd, "wb") as f:
+        f.write(dumps(g, _source_fingerprint(source)))
+    os.replace(tmp, path)
+    return path
+
+
+def load_graph(source, format=None, graph=None):
+    """Load ``source`` into ``graph`` (or a new Graph), using its snapshot
+    when it is up to date and refreshing the snapshot otherwise."""
+    if source.startswith(("http://", "https://")):
+        source = cached_loader.fetch(source)
+    if source.endswith(SUFFIX):
+        with open(source, "rb") as f:
+            return loads(f.read(), graph)
+
+    path = snapshot_path(source)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        data = None
+    if data is not None and _is_fresh(data, source):
+        return loads(data, graph)
+
+    parsed = Graph()
+    parsed.parse(source, format=format or guess_format(source))
+    try:
+        write_snapshot(parsed, source, path)
+    except OSError:
+        pass  # read-only cache: still return the parsed graph
+    if graph is None:
+        return parsed
+    for prefix, namespace in parsed.namespace_manager.namespaces():
+        graph.namespace_manager.bind(prefix, namespace, override=False)
+    graph += parsed
+    return graph
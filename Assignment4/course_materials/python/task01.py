@@ -13,13 +13,14 @@ Leer y escribir ficheros que contienen tripletas es muy sencillo en RDFlib, para
 
 !pip install rdflib
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/refs/heads/master/Assignment4"
+from cached_loader import cached_parse
 
 from rdflib import Graph, Namespace, Literal
 g = Graph()
 
 """Podemos añadir tripletas a nuestro grafo empleando *parse*, que leerá el recurso proporcionado. Debemos además indicarle el formato si este no puede ser inferido."""
 
-g.parse(github_storage+"/resources/example1.rdf", format="xml")
+cached_parse(g, github_storage+"/resources/example1.rdf", format="xml")
 
 """Para visualizar el grafo en un formato específico podemos utilizar *serialize*. Por ejemplo aquí mostramos la salida del grafo en turtle"""
 
@@ -27,7 +28,7 @@ print(g.serialize(format="ttl").decode("UTF-8"))
 
 """El recurso puede ser local o remoto, como en nuestro caso. El resultado es el mismo. Podemos añadir todos los datos que queramos a nuestro grafo, los datos simplemente se irán fusionando."""
 
-g.parse(github_storage+"/resources/example2.rdf", format="xml")
+cached_parse(g, github_storage+"/resources/example2.rdf", format="xml")
 
 """Ahora podemos comprobar el resultado volcando las tripletas de forma sencilla."""
 
@@ -11,12 +11,13 @@ Original file is located at
 
 !pip install rdflib
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/refs/heads/master/Assignment4"
+from cached_loader import cached_parse
 
 """Importamos example3.rdf en nuestro grafo"""
 
 from rdflib import Graph, Namespace, Literal
 g = Graph()
-g.parse(github_storage+"/resources/example3.rdf", format="xml")
+cached_parse(g, github_storage+"/resources/example3.rdf", format="xml")
 
 """Listamos todos los recursos con la propiedad VCARD:FN"""
 
@@ -11,10 +11,11 @@ Original file is located at
 
 !pip install rdflib
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/refs/heads/master/Assignment4"
+from cached_loader import cached_parse
 
 from rdflib import Graph, Namespace, Literal
 g = Graph()
-g.parse(github_storage+"/resources/example3.rdf", format="xml")
+cached_parse(g, github_storage+"/resources/example3.rdf", format="xml")
 
 """Listamos todos los recursos que contienen la propiedad VCARD:FN"""
 
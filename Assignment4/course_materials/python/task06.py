@@ -10,10 +10,13 @@ Original file is located at
 """
 
 !pip install rdflib
-import urllib.request
 url = 'https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/refs/heads/master/Assignment4/course_materials/python/validation.py'
-urllib.request.urlretrieve(url, 'validation.py')
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/master/Assignment4/course_materials"
+try:
+    from cached_loader import cached_retrieve
+except ImportError:  # copied out of course_materials/python, e.g. into a submission folder
+    from urllib.request import urlretrieve as cached_retrieve
+cached_retrieve(url, 'validation.py')
 
 """Import RDFLib main methods"""
 
@@ -10,10 +10,16 @@ Original file is located at
 """
 
 !pip install rdflib
-import urllib.request
 url = 'https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/refs/heads/master/Assignment4/course_materials/python/validation.py'
-urllib.request.urlretrieve(url, 'validation.py')
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2025-2026/master/Assignment4/course_materials"
+try:
+    from cached_loader import cached_parse, cached_retrieve
+except ImportError:  # copied out of course_materials/python, e.g. into a submission folder
+    from urllib.request import urlretrieve as cached_retrieve
+
+    def cached_parse(g, url, format=None):
+        return g.parse(url, format=format)
+cached_retrieve(url, 'validation.py')
 
 from validation import Report
 
@@ -24,7 +30,7 @@ from rdflib.namespace import RDF, RDFS
 # Do not change the name of the variables
 g = Graph()
 g.namespace_manager.bind('ns', Namespace("http://somewhere#"), override=False)
-g.parse(github_storage+"/rdf/data06.ttl", format="TTL")
+cached_parse(g, github_storage+"/rdf/data06.ttl", format="TTL")
 report = Report()
 
 """**TASK 7.1a: For all classes, list each classURI. If the class belogs to another class, then list its superclass.**
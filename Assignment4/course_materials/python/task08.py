@@ -7,11 +7,12 @@ Automatically generated by Colab.
 
 #!pip install rdflib
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2021-2022/master/Assignment4/course_materials"
+from cached_loader import cached_parse
 
 from rdflib import Graph, Namespace, Literal, URIRef
 g1 = Graph()
 g2 = Graph()
-g1.parse(github_storage+"/rdf/data01.rdf", format="xml")
-g2.parse(github_storage+"/rdf/data02.rdf", format="xml")
+cached_parse(g1, github_storage+"/rdf/data01.rdf", format="xml")
+cached_parse(g2, github_storage+"/rdf/data02.rdf", format="xml")
 
 """Tarea: lista todos los elementos de la clase Person en el primer grafo (data01.rdf) y completa los campos (given name, family name y email) que puedan faltar con los datos del segundo grafo (data02.rdf). Puedes usar consultas SPARQL o iterar el grafo, o ambas cosas."""
@@ -6,13 +6,14 @@ Automatically generated by Colab.
 
 #!pip install rdflib
 github_storage = "https://raw.githubusercontent.com/FacultadInformatica-LinkedData/Curso2021-2022/master/Assignment4/course_materials/"
+from cached_loader import cached_parse
 
 from rdflib import Graph, Namespace, Literal, URIRef
 g1 = Graph()
 g2 = Graph()
 g3 = Graph()
-g1.parse(github_storage+"rdf/data03.rdf", format="xml")
-g2.parse(github_storage+"rdf/data04.rdf", format="xml")
+cached_parse(g1, github_storage+"rdf/data03.rdf", format="xml")
+cached_parse(g2, github_storage+"rdf/data04.rdf", format="xml")
 
 """Busca individuos en los dos grafos y enlázalos mediante la propiedad OWL:sameAs, inserta estas coincidencias en g3. Consideramos dos individuos iguales si tienen el mismo apodo y nombre de familia. Ten en cuenta que las URI no tienen por qué ser iguales para un mismo individuo en los dos grafos."""
 
@@ -1,12 +1,42 @@
+import functools
+import json
+import os
+import time
+
 from rdflib import Graph, Namespace, Literal, XSD
 from rdflib.namespace import RDF, RDFS
 
 VCARD = Namespace("http://www.w3.org/2001/vcard-rdf/3.0/")
 FOAF = Namespace("http://xmlns.com/foaf/0.1/")
 
+# When set, every Report streams its check results to this JSON Lines file
+JSONL_ENV = "VALIDATION_REPORT_JSONL"
+
+
+def check(name):
+    # Times a validate_* method and records its messages as one check result
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            self._start_check(name)
+            start = time.perf_counter()
+            try:
+                return method(self, *args, **kwargs)
+            finally:
+                self._finish_check(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
 class Report:
-    def __init__(self):
-        self.__report = ""
+    def __init__(self, verbose=True, jsonl_path=None):
+        self.verbose = verbose
+        self.jsonl_path = jsonl_path or os.environ.get(JSONL_ENV)
+        self.results = []
+        self.__lines = []
+        self.__current = None
+        self.__label_graph = None
+        self.__label_index = None
 
     def domain_and_range_correspond_to_input(self, g,propertyURI,correct_domain,correct_range):
         domain = g.value(subject=propertyURI, predicate=RDFS.domain)
@@ -43,17 +73,56 @@ class Report:
             return False
         return True
 
+    def label_index(self, g):
+        # label -> URI, built in one pass over the rdfs:label triples. The
+        # tasks edit the graph between checks, so every check starts with a
+        # fresh index (see _start_check)
+        if self.__label_index is None or g is not self.__label_graph:
+            index = {}
+            for s, label in g.subject_objects(predicate=RDFS.label):
+                index.setdefault(label, s)
+            self.__label_graph = g
+            self.__label_index = index
+        return self.__label_index
+
+    def find_by_label(self, g, label):
+        return self.label_index(g).get(Literal(label, datatype=XSD.string))
+
     def __add_to_report(self, message):
-        print(message)
-        self.__report = self.__report + message + "\n"
+        if self.verbose:
+            print(message)
+        self.__lines.append(message)
+        if self.__current is not None:
+            self.__current["messages"].append(message)
+
+    def _start_check(self, name):
+        self.__label_index = None
+        self.__current = {
+            "task": "Task_%02d" % int(name.split(".")[0]),
+            "check": name,
+            "passed": True,
+            "messages": [],
+        }
+
+    def _finish_check(self, seconds):
+        result = self.__current
+        self.__current = None
+        result["seconds"] = round(seconds, 6)
+        result["passed"] = bool(result["messages"]) and \
+            not any(m.startswith("ERROR") for m in result["messages"])
+        self.results.append(result)
+        if self.jsonl_path:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result) + "\n")
 
+    @check("6.1")
     def validate_task_06_01(self, g):
         error = False
-        professorURI = g.value(subject=None, predicate=RDFS.label, object=Literal("Professor", datatype=XSD.string))
-        personURI = g.value(subject=None, predicate=RDFS.label, object=Literal("Person", datatype=XSD.string))
-        associateProfessorURI = g.value(subject=None, predicate=RDFS.label, object=Literal("AssociateProfessor", datatype=XSD.string))
-        interimURI = g.value(subject=None, predicate=RDFS.label, object=Literal("InterimAssociateProfessor", datatype=XSD.string))
-        fProfessorURI = g.value(subject=None, predicate=RDFS.label, object=Literal("FullProfessor", datatype=XSD.string))
+        professorURI = self.find_by_label(g, "Professor")
+        personURI = self.find_by_label(g, "Person")
+        associateProfessorURI = self.find_by_label(g, "AssociateProfessor")
+        interimURI = self.find_by_label(g, "InterimAssociateProfessor")
+        fProfessorURI = self.find_by_label(g, "FullProfessor")
         classes = [professorURI,personURI,associateProfessorURI,interimURI, fProfessorURI]
         # check namespace and existence
         for i in classes:
@@ -62,7 +131,8 @@ class Report:
                 error = True
                 return
             if self.namespace_is_correct_class(i):
-                print("The namespace is correct for " + str(i))
+                if self.verbose:
+                    print("The namespace is correct for " + str(i))
             else:
                 self.__add_to_report("ERROR: The namespace is not correct for " + str(i))
                 error = True
@@ -80,14 +150,15 @@ class Report:
         else:
             self.__add_to_report("TASK 6.1 OK")
 
+    @check("6.2")
     def validate_task_06_02(self, g):
         # check properties
         error = False
-        hasColleague  = g.value(subject=None, predicate=RDFS.label, object=Literal("hasColleague", datatype=XSD.string))
-        hasName = g.value(subject=None, predicate=RDFS.label, object=Literal("hasName", datatype=XSD.string))
-        hasHomePage = g.value(subject=None, predicate=RDFS.label, object=Literal("hasHomePage", datatype=XSD.string))
-        personURI = g.value(subject=None, predicate=RDFS.label, object=Literal("Person", datatype=XSD.string))
-        fullProfessorURI = g.value(subject=None, predicate=RDFS.label, object=Literal("FullProfessor", datatype=XSD.string))
+        hasColleague  = self.find_by_label(g, "hasColleague")
+        hasName = self.find_by_label(g, "hasName")
+        hasHomePage = self.find_by_label(g, "hasHomePage")
+        personURI = self.find_by_label(g, "Person")
+        fullProfessorURI = self.find_by_label(g, "FullProfessor")
         properties = [hasColleague, hasName, hasHomePage]
         for i in properties:
             if i is None:
@@ -108,12 +179,13 @@ class Report:
         else:
             self.__add_to_report("TASK 6.2 OK")
 
+    @check("6.3")
     def validate_task_06_03(self, g):
         # check all individuals can be retrieved through their label
         error = False
-        oscar  = g.value(subject=None, predicate=RDFS.label, object=Literal("Oscar", datatype=XSD.string))
-        asun  = g.value(subject=None, predicate=RDFS.label, object=Literal("Asun", datatype=XSD.string))
-        raul  = g.value(subject=None, predicate=RDFS.label, object=Literal("Raul", datatype=XSD.string))
+        oscar  = self.find_by_label(g, "Oscar")
+        asun  = self.find_by_label(g, "Asun")
+        raul  = self.find_by_label(g, "Raul")
         if oscar is None or asun is None or raul is None:
             self.__add_to_report("ERROR: One of the individuals is missing its correct label! I cannot retrieve it")
             error = True
@@ -147,12 +219,13 @@ class Report:
         else:
             self.__add_to_report("TASK 6.3 OK")
 
+    @check("6.4")
     def validate_task_06_04(self, g):
         error = False
         target_properties = [VCARD.Given, VCARD.Family, FOAF.email]
         #retrieve all triples from Oscar.
         oscar_properties = []
-        oscar  = g.value(subject=None, predicate=RDFS.label, object=Literal("Oscar", datatype=XSD.string))
+        oscar  = self.find_by_label(g, "Oscar")
         for p in g.predicates(subject=oscar):
             oscar_properties.append(p)
         if oscar_properties is None:
@@ -171,7 +244,7 @@ class Report:
     def save_report(self, task):
         report_name = "report_result" + task + ".txt"
         with open(report_name, "w", encoding="utf-8") as f:
-            f.write(self.__report)
+            f.write("".join(line + "\n" for line in self.__lines))
 
     def validate_07_01(self, result, task):
         error = False
@@ -193,11 +266,12 @@ class Report:
         if not error:
             self.__add_to_report(task+" OK")
 
+    @check("7.1a")
     def validate_07_1a(self, result):
         self.validate_07_01(result, "TASK 7.1a")
 
+    @check("7.1b")
     def validate_07_1b(self, query, g):
-        aux = g.query(query)
         aux_dict = []
         for r in g.query(query):
             aux_dict.append((r.c, r.sc))
@@ -216,12 +290,13 @@ class Report:
             self.__add_to_report(task+" OK")
 
 
+    @check("7.2a")
     def validate_07_02a(self, individuals):
         self.validate_07_02(individuals, "TASK 7.2a")
 
+    @check("7.2b")
     def validate_07_02b(self, g, query):
         error = False
-        aux = g.query(query)
         aux_dict = []
         for r in g.query(query):
             if (r.ind is None):
@@ -231,10 +306,11 @@ class Report:
                 aux_dict.append(r.ind)
         self.validate_07_02(aux_dict, "TASK 7.2b")
 
+    @check("7.3")
     def validate_07_03(self, g, query):
         error = False
-        entities = g.query(query)
-        if len(list(entities)) != 3:
+        entities = list(g.query(query))
+        if len(entities) != 3:
             self.__add_to_report("ERROR: The number of individuals returned is not correct")
             error = True
         for i in entities:
@@ -244,10 +320,11 @@ class Report:
         if not error:
             self.__add_to_report("TASK 7.3 OK")
 
+    @check("7.4")
     def validate_07_04(self, g, query):
         error = False
-        entities = g.query(query)
-        if len(list(entities)) != 3:
+        entities = list(g.query(query))
+        if len(entities) != 3:
             self.__add_to_report("ERROR: The number of individuals returned is not correct")
             error = True
         for i in entities:
@@ -1,30 +1,79 @@
 # backend/app.py - FastAPI endpoints
 from pathlib import Path
-from typing import Optional, List
-from collections import defaultdict, deque
+from typing import Optional, List, Dict, Any
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from pydantic import BaseModel, Field
-import httpx
 from contextlib import asynccontextmanager
+import os
+import secrets
 
-from utils import query_sparql, parse_point_wkt, parse_multilinestring_wkt, SPARQL_ENDPOINT
+from utils import (
+    query_sparql, parse_point_wkt, SPARQL_ENDPOINT,
+    open_client, close_client, get_client, pool_stats,
+    embedded_enabled, get_store, close_store
+)
+from transit import NetworkIndex, NETWORK_QUERY, DEFAULT_TRANSFER_PENALTY_M
+from cache import DatasetVersion, ResponseCache, FINGERPRINT_QUERY
+from geometry import parse_multilinestring_cached, encode_parts
+from sparql_proxy import SparqlProxy
+from events import ChangeFeed
 
 # Obtener la ruta absoluta del directorio frontend
 BASE_DIR = Path(__file__).resolve().parent.parent
 FRONTEND_DIR = BASE_DIR / "frontend"
 RESOURCES_DIR = BASE_DIR / "resources"
 
+# Segundos que se reutiliza el índice de la red antes de reconstruirlo (0 = sin caducidad)
+NETWORK_TTL = float(os.environ.get("NETWORK_TTL", "3600"))
+TRANSFER_PENALTY_M = float(os.environ.get("ROUTE_TRANSFER_PENALTY_M", str(DEFAULT_TRANSFER_PENALTY_M)))
+
+
+async def load_network_bindings():
+    data = await query_sparql(NETWORK_QUERY)
+    return data.get("results", {}).get("bindings", [])
+
+
+network_index = NetworkIndex(load_network_bindings, NETWORK_TTL)
+
+# Segundos entre comprobaciones de si el dataset de Fuseki ha cambiado (0 = solo a mano)
+# y consulta cuya primera fila identifica la versión del dataset
+DATASET_CHECK_INTERVAL = float(os.environ.get("DATASET_CHECK_INTERVAL", "300"))
+DATASET_FINGERPRINT_QUERY = os.environ.get("DATASET_FINGERPRINT_QUERY", FINGERPRINT_QUERY)
+dataset_version = DatasetVersion(DATASET_CHECK_INTERVAL, DATASET_FINGERPRINT_QUERY)
+response_cache = ResponseCache(dataset_version)
+
+# Token para las operaciones de administración (cabecera X-Admin-Token); sin él
+# quedan desactivadas, ya que vaciar cachés y reconstruir el índice carga Fuseki
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
+# Caché de /api/query: segundos de vida, memoria máxima y consultas simultáneas a Fuseki
+SPARQL_CACHE_TTL = float(os.environ.get("SPARQL_CACHE_TTL", "300"))
+SPARQL_CACHE_MAX_BYTES = int(os.environ.get("SPARQL_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+SPARQL_MAX_CONCURRENT = int(os.environ.get("SPARQL_MAX_CONCURRENT", "8"))
+sparql_proxy = SparqlProxy(query_sparql, SPARQL_CACHE_TTL, SPARQL_CACHE_MAX_BYTES, SPARQL_MAX_CONCURRENT)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Código al iniciar
+    # Código al iniciar: un único cliente HTTP (keep-alive) para todas las consultas
+    open_client()
+    if embedded_enabled():
+        await get_store().open()
+    try:
+        await network_index.refresh()
+    except HTTPException as e:
+        # Fuseki no disponible: el índice se construirá en la primera ruta
+        print(f"No se pudo construir el índice de la red: {e.detail}")
     yield
     # Código al cerrar (limpieza)
-    pass
+    await change_feed.close()
+    await dataset_version.close()
+    await close_client()
+    close_store()
 
 
 app = FastAPI(
@@ -51,10 +100,15 @@ class SparqlQueryRequest(BaseModel):
         description="Formato de respuesta"
     )
 
+class StationDetailsRequest(BaseModel):
+    ids: List[str] = Field(..., min_length=1, max_length=500, description="URIs de las estaciones")
+
 class HealthResponse(BaseModel):
     backend: str
     sparql_endpoint: str
     sparql_status: str
+    pool: Optional[Dict[str, Any]] = None
+    store: Optional[Dict[str, Any]] = None
 
 class StationResponse(BaseModel):
     id: str
@@ -93,15 +147,27 @@ async def index():
 @app.post("/api/query")
 async def proxy_sparql(body: SparqlQueryRequest):
     """
-    Ejecuta una consulta SPARQL y devuelve los resultados
+    Ejecuta una consulta SPARQL y devuelve los resultados. Las respuestas se
+    cachean por (consulta normalizada, formato, versión del dataset) y las
+    peticiones idénticas simultáneas comparten una sola consulta a Fuseki
     """
-    result = await query_sparql(body.query, body.format)
-    return result
+    version = await dataset_version.current()
+    content, mime = await sparql_proxy.execute(body.query, body.format, version)
+    return Response(content=content, media_type=mime)
 
 
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
     """Verifica el estado del backend y del endpoint SPARQL"""
+    if embedded_enabled():
+        store = get_store()
+        return {
+            "backend": "ok",
+            "sparql_endpoint": f"embedded:{store.path}",
+            "sparql_status": "embedded" if store.graph is not None else "loading",
+            "store": store.stats(),
+        }
+
     status = {
         "backend": "ok",
         "sparql_endpoint": SPARQL_ENDPOINT,
@@ -109,18 +175,22 @@ async def health_check():
     }
     
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            resp = await client.get(SPARQL_ENDPOINT.replace("/sparql", "/$/ping"))
-            status["sparql_status"] = "connected" if resp.status_code == 200 else "unreachable"
+        resp = await get_client().get(SPARQL_ENDPOINT.replace("/sparql", "/$/ping"), timeout=5.0)
+        status["sparql_status"] = "connected" if resp.status_code == 200 else "unreachable"
     except:
         status["sparql_status"] = "unreachable"
     
+    status["pool"] = pool_stats()
     return status
 
 
 @app.get("/api/stations", response_model=List[StationResponse])
-async def get_stations():
+async def get_stations(request: Request):
     """Obtiene todas las estaciones con sus coordenadas y líneas"""
+    return await response_cache.respond(request, "stations", load_stations)
+
+
+async def load_stations() -> List[StationResponse]:
     query = """
     PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
     PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
@@ -163,8 +233,12 @@ async def get_stations():
 
 
 @app.get("/api/lines", response_model=List[LineResponse])
-async def get_lines():
+async def get_lines(request: Request):
     """Obtiene todas las líneas con información"""
+    return await response_cache.respond(request, "lines", load_lines)
+
+
+async def load_lines() -> List[LineResponse]:
     query = """
     PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
     PREFIX metro: <https://data.example.org/transport/bcn/metro/ontology#>
@@ -255,9 +329,110 @@ async def get_station_details(station_id: str):
     return station
 
 
+# Caracteres no permitidos en un IRI de SPARQL (evita inyectar texto en el VALUES)
+INVALID_IRI_CHARS = set('<>"{}|^`\\ \t\r\n')
+
+
+def station_details_query(uris: List[str], full: bool) -> str:
+    """Consulta con VALUES para varias estaciones; sin ``full`` solo pide la inauguración"""
+    values = " ".join(f"<{uri}>" for uri in uris)
+    if not full:
+        return f"""
+    PREFIX metro: <https://data.example.org/transport/bcn/metro/ontology#>
+
+    SELECT ?station ?inaugurated
+    WHERE {{
+      VALUES ?station {{ {values} }}
+      ?station metro:inauguratedDate ?inaugurated
+    }}
+    """
+    return f"""
+    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+    PREFIX metro: <https://data.example.org/transport/bcn/metro/ontology#>
+
+    SELECT ?station ?name ?geometry ?inaugurated
+           (GROUP_CONCAT(DISTINCT ?lineCode; separator=",") AS ?lines)
+    WHERE {{
+      VALUES ?station {{ {values} }}
+      ?station rdfs:label ?name .
+      OPTIONAL {{ ?station metro:hasGeometry ?geometry }}
+      OPTIONAL {{ ?station metro:inauguratedDate ?inaugurated }}
+      OPTIONAL {{
+        ?stationLine metro:relatesTo ?station .
+        ?stationLine metro:onLine ?line .
+        ?line metro:lineCode ?lineCode
+      }}
+    }}
+    GROUP BY ?station ?name ?geometry ?inaugurated
+    """
+
+
+@app.post("/api/stations/details")
+async def get_stations_details(body: StationDetailsRequest):
+    """
+    Detalles de varias estaciones con una sola consulta SPARQL, indexados por URI.
+    Si el índice de la red está construido, nombre, coordenadas y líneas salen
+    de él y la consulta solo pide la fecha de inauguración
+    """
+    uris = list(dict.fromkeys(body.ids))
+    valid = [uri for uri in uris if uri and not INVALID_IRI_CHARS.intersection(uri)]
+    stations: Dict[str, Dict[str, Any]] = {}
+
+    network = network_index.network
+    summaries = {uri: network.station_summary(uri) for uri in valid} if network is not None else {}
+    indexed = bool(valid) and all(summaries.get(uri) for uri in valid)
+
+    if valid:
+        data = await query_sparql(station_details_query(valid, full=not indexed))
+        bindings = data.get("results", {}).get("bindings", [])
+        if indexed:
+            inaugurated = {}
+            for binding in bindings:
+                inaugurated.setdefault(binding["station"]["value"], binding["inaugurated"]["value"])
+            for uri in valid:
+                stations[uri] = {**summaries[uri], "inaugurated": inaugurated.get(uri, "")}
+        else:
+            for binding in bindings:
+                uri = binding.get("station", {}).get("value", "")
+                if uri in stations:
+                    continue
+                coords = parse_point_wkt(binding.get("geometry", {}).get("value", ""))
+                stations[uri] = {
+                    "id": uri,
+                    "name": binding.get("name", {}).get("value", ""),
+                    "latitude": coords["lat"] if coords else None,
+                    "longitude": coords["lng"] if coords else None,
+                    "inaugurated": binding.get("inaugurated", {}).get("value", ""),
+                    "lines": binding.get("lines", {}).get("value", "").split(",") if binding.get("lines") else []
+                }
+
+    return {
+        "stations": {uri: stations[uri] for uri in uris if uri in stations},
+        "missing": [uri for uri in uris if uri not in stations],
+    }
+
+
 @app.get("/api/line-geometries")
-async def get_line_geometries():
+async def get_line_geometries(
+    request: Request,
+    format: str = Query("objects", pattern="^(objects|parts|flat|polyline)$",
+                        description="objects: lista de {lat, lng}; parts: [lat, lng] por parte; "
+                                    "flat: [lat, lng, ...] por parte; polyline: polilínea codificada por parte"),
+    zoom: Optional[int] = Query(None, ge=0, le=22, description="Simplifica las líneas para este zoom"),
+    codes: Optional[str] = Query(None, description="Códigos de línea separados por comas (todas si se omite)")
+):
     """Obtiene las geometrías de todas las líneas desde MULTILINESTRING WKT"""
+    if codes:
+        # Solo algunas líneas (p. ej. las cambiadas según /api/events): sin caché
+        wanted = set(codes.split(","))
+        return [line for line in await load_line_geometries(format, zoom) if line["code"] in wanted]
+    return await response_cache.respond(
+        request, f"line-geometries:{format}:{zoom}",
+        lambda: load_line_geometries(format, zoom)
+    )
+
+
+async def load_line_geometries(format: str = "objects", zoom: Optional[int] = None) -> List[Dict[str, Any]]:
     query = """
     PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
     PREFIX metro: <https://data.example.org/transport/bcn/metro/ontology#>
@@ -283,7 +458,12 @@ async def get_line_geometries():
         if not geometry_wkt:
             continue
         
-        coordinates = parse_multilinestring_wkt(geometry_wkt)
+        try:
+            parts = parse_multilinestring_cached(geometry_wkt)
+        except ValueError as e:
+            print(f"Geometría de la línea {line_code} descartada: {e}")
+            continue
+        coordinates = encode_parts(list(parts), format, zoom)
         
         if coordinates:
             result.append({
@@ -350,8 +530,12 @@ async def get_line_details(line_code: str):
 
 
 @app.get("/api/examples", response_model=List[ExampleQuery])
-async def get_examples():
+async def get_examples(request: Request):
     """Devuelve consultas SPARQL de ejemplo para el dominio de metro"""
+    return await response_cache.respond(request, "examples", load_examples)
+
+
+async def load_examples() -> List[ExampleQuery]:
     examples = [
         ExampleQuery(
             name="Todas las líneas de metro",
@@ -465,159 +649,110 @@ async def get_examples():
 
 
 @app.get("/api/route")
-async def find_route(origin: str = Query(...), destination: str = Query(...)):
+async def find_route(
+    origin: str = Query(...),
+    destination: str = Query(...),
+    algorithm: str = Query("astar", pattern="^(astar|bfs)$",
+                           description="astar: distancia + transbordos; bfs: menos paradas"),
+    k: int = Query(1, ge=1, le=5, description="Número de rutas (la mejor y sus alternativas)"),
+    transfer_penalty: float = Query(TRANSFER_PENALTY_M, ge=0,
+                                    description="Penalización por transbordo en metros equivalentes")
+):
     """
     Encuentra la ruta más corta entre dos estaciones
     """
-    query = """
-    PREFIX metro: <https://data.example.org/transport/bcn/metro/ontology#>
-    PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
-    PREFIX geo: <http://www.opengis.net/ont/geosparql#>
-    
-    SELECT ?station ?stationName ?lineCode ?order ?lineGeometry ?stationGeometry
-    WHERE {
-      ?station a metro:Station ;
-               rdfs:label ?stationName .
-      ?accessPoint metro:relatesTo ?station ;
-                   metro:onLine ?line ;
-                   metro:stationOrder ?order .
-      ?line metro:lineCode ?lineCode .
-      OPTIONAL { ?line metro:hasGeometry ?lineGeometry }
-      OPTIONAL { ?station metro:hasGeometry ?stationGeometry }
-    }
-    ORDER BY ?lineCode ?order
-    """
-    
-    data = await query_sparql(query)
-    
-    # Construir grafo y estructuras de datos
-    stations_by_name = defaultdict(list)
-    station_names = {}
-    station_coords = {}
-    station_lines = defaultdict(set)
-    line_stations = defaultdict(list)
-    line_geometries = {}
-    
-    for binding in data.get("results", {}).get("bindings", []):
-        station_uri = binding.get("station", {}).get("value", "")
-        station_name = binding.get("stationName", {}).get("value", "")
-        line_code = str(binding.get("lineCode", {}).get("value", ""))
-        order = int(binding.get("order", {}).get("value", 0))
-        line_geom = binding.get("lineGeometry", {}).get("value", "")
-        station_geom = binding.get("stationGeometry", {}).get("value", "")
-        
-        stations_by_name[station_name].append(station_uri)
-        station_names[station_uri] = station_name
-        station_lines[station_name].add(line_code)
-        line_stations[line_code].append((station_name, order, station_uri))
-        
-        if station_geom and station_uri not in station_coords:
-            coords = parse_point_wkt(station_geom)
-            if coords:
-                station_coords[station_uri] = (coords['lat'], coords['lng'])
-        
-        if line_geom and line_code not in line_geometries:
-            line_geometries[line_code] = line_geom
-    
-    # Verificar que origen y destino existen
-    if origin not in stations_by_name:
-        return {"found": False, "error": f"Estación origen '{origin}' no encontrada"}
-    if destination not in stations_by_name:
-        return {"found": False, "error": f"Estación destino '{destination}' no encontrada"}
-    
-    # Construir grafo
-    graph = defaultdict(list)
-    
-    for line_code, stations in line_stations.items():
-        unique_stations = {}
-        for name, order, uri in stations:
-            if name not in unique_stations or order < unique_stations[name][0]:
-                unique_stations[name] = (order, uri)
-        
-        sorted_stations = sorted(unique_stations.items(), key=lambda x: x[1][0])
-        
-        for i in range(len(sorted_stations) - 1):
-            name1, _ = sorted_stations[i]
-            name2, _ = sorted_stations[i + 1]
-            graph[name1].append((name2, line_code))
-            graph[name2].append((name1, line_code))
-    
-    # BFS para encontrar ruta más corta
-    queue = deque([(origin, [origin], [])])
-    visited = {origin}
-    
-    while queue:
-        current, path, lines = queue.popleft()
-        
-        if current == destination:
-            # Construir respuesta
-            route_stations = []
-            route_segments = []
-            
-            for i, station_name in enumerate(path):
-                station_uri = stations_by_name[station_name][0]
-                route_stations.append({
-                    "name": station_name,
-                    "uri": station_uri
-                })
-                
-                if i < len(path) - 1:
-                    line_code = lines[i]
-                    next_station_name = path[i + 1]
-                    
-                    current_uri = station_uri
-                    next_uri = stations_by_name[next_station_name][0]
-                    
-                    current_coords = station_coords.get(current_uri)
-                    next_coords = station_coords.get(next_uri)
-                    
-                    segment_info = {
-                        "line_code": line_code,
-                        "from_station": station_name,
-                        "to_station": next_station_name
-                    }
-                    
-                    if line_code in line_geometries and current_coords and next_coords:
-                        segment_info["geometry"] = line_geometries[line_code]
-                        segment_info["from_coords"] = current_coords
-                        segment_info["to_coords"] = next_coords
-                    
-                    route_segments.append(segment_info)
-            
-            # Calcular transbordos
-            transfers = []
-            current_line = None
-            for i, line_code in enumerate(lines):
-                if current_line and current_line != line_code:
-                    transfers.append({
-                        "station": path[i],
-                        "from_line": current_line,
-                        "to_line": line_code
-                    })
-                current_line = line_code
-            
-            return {
-                "found": True,
-                "stations": route_stations,
-                "lines": lines,
-                "segments": route_segments,
-                "transfers": transfers,
-                "num_stations": len(route_stations),
-                "num_transfers": len(transfers)
-            }
-        
-        # Explorar vecinos
-        for neighbor, line_code in graph.get(current, []):
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append((neighbor, path + [neighbor], lines + [line_code]))
-    
+    network = await network_index.get()
+    if algorithm == "bfs":
+        return network.route(origin, destination)
+    return network.weighted_route(origin, destination, k, transfer_penalty)
+
+
+@app.get("/api/cache")
+async def get_cache_stats():
+    """Estado de la caché de respuestas de los endpoints de datos estáticos"""
+    return {**response_cache.stats(), "events": change_feed.stats()}
+
+
+async def load_change_snapshot():
+    """Estaciones, líneas y geometrías por id, para calcular los deltas de /api/events"""
     return {
-        "found": False,
-        "error": "No se encontró ruta entre las estaciones"
+        "stations": {station.id: station for station in await load_stations()},
+        "lines": {line.code: line for line in await load_lines()},
+        "line_geometries": {line["code"]: line["coordinates"] for line in await load_line_geometries("flat")},
     }
 
 
+change_feed = ChangeFeed(dataset_version, load_change_snapshot)
+
+
+@app.get("/api/events")
+async def dataset_events(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Última versión del dataset que tiene el cliente"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Flujo Server-Sent Events con la versión del dataset. En cada cambio envía un
+    evento "dataset" con las estaciones y líneas añadidas, cambiadas o borradas
+    (o "resync": true si el cliente debe recargarlo todo)
+    """
+    last_version = since
+    if last_event_id and last_event_id.isdigit():
+        last_version = int(last_event_id)
+    return StreamingResponse(
+        change_feed.stream(request, last_version),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def is_admin(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and secrets.compare_digest(token, ADMIN_TOKEN)
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin operations are disabled (ADMIN_TOKEN not set)")
+    if not is_admin(x_admin_token):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+@app.post("/api/cache/invalidate", dependencies=[Depends(require_admin)])
+async def invalidate_cache():
+    """Marca el dataset como recargado: vacía la caché y reconstruye el índice de la red"""
+    dataset_version.bump()
+    response_cache.clear()
+    sparql_proxy.cache.clear()
+    await network_index.refresh()
+    return response_cache.stats()
+
+
+@app.get("/api/metrics")
+async def get_metrics(
+    detail: bool = Query(False, description="Incluir cada consulta seguida (requiere X-Admin-Token)"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Aciertos, agrupaciones y latencias de /api/query; el detalle por consulta solo para administración"""
+    if detail:
+        await require_admin(x_admin_token)
+    return sparql_proxy.metrics(detail)
+
+
+@app.get("/api/network")
+async def get_network_stats():
+    """Tamaño y tiempo de construcción del índice de la red usado por /api/route"""
+    if network_index.network is None:
+        return {"built": False, "ttl_seconds": network_index.ttl}
+    return {"built": True, "ttl_seconds": network_index.ttl, **network_index.network.stats()}
+
+
+@app.post("/api/network/refresh", dependencies=[Depends(require_admin)])
+async def refresh_network():
+    """Reconstruye el índice de la red (p. ej. tras recargar el dataset en Fuseki)"""
+    network = await network_index.refresh()
+    return {"built": True, "ttl_seconds": network_index.ttl, **network.stats()}
+
+
 # Servir archivos de recursos (documentación)
 app.mount("/resources", StaticFiles(directory=str(RESOURCES_DIR), html=True), name="resources")
 
@@ -0,0 +1,317 @@
+# backend/benchmark.py - Prueba de carga y latencias de la API del metro
+"""
+Lanza tráfico mixto (estaciones, líneas, geometrías, detalle de estación y rutas)
+contra la API y muestra por endpoint p50/p95/p99, throughput y memoria asignada.
+
+Uso:
+  python benchmark.py                              # API en proceso con el grafo embebido
+  python benchmark.py --backend stand-in           # API en proceso + servidor SPARQL local por HTTP
+  python benchmark.py --url http://localhost:8000  # API ya arrancada (sin medida de memoria)
+  python benchmark.py --save-baseline bench_baseline.json
+  python benchmark.py --compare bench_baseline.json --max-regression 0.25 --min-delta-ms 2
+
+Las latencias absolutas dependen de la máquina: la línea base no se versiona.
+Cada máquina genera la suya con --save-baseline (sobre la rama de referencia) y
+compara contra ella; hay que regenerarla al cambiar de máquina, de versión de
+Python o de opciones de carga (--requests, --concurrency).
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, quote, urlparse
+
+import httpx
+
+DATA_FILE = Path(__file__).resolve().parent.parent.parent / "rdf" / "metro-with-links.ttl"
+
+# Peso relativo de cada tipo de petición en el tráfico mixto
+MIX = {
+    "stations": 3,
+    "lines": 3,
+    "line-geometries": 2,
+    "station": 4,
+    "route": 4,
+}
+
+
+def start_stand_in(path: Path) -> Tuple[ThreadingHTTPServer, str]:
+    """Servidor SPARQL mínimo (protocolo GET de Fuseki) sobre rdflib en un puerto libre"""
+    from rdflib import Graph
+
+    graph = Graph()
+    graph.parse(str(path))
+    lock = threading.Lock()  # rdflib no garantiza consultas concurrentes seguras
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            status, content_type = 200, "application/sparql-results+json"
+            if url.path.endswith("/$/ping"):
+                body, content_type = b"ok", "text/plain"
+            else:
+                try:
+                    with lock:
+                        body = graph.query(parse_qs(url.query)["query"][0]).serialize(format="json")
+                except Exception as e:
+                    status, body, content_type = 400, str(e).encode("utf-8"), "text/plain"
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/dataset/sparql"
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def build_requests(stations: List[Dict[str, Any]], rng: random.Random) -> Dict[str, Callable[[], str]]:
+    """Generadores de URL para cada tipo de petición a partir de las estaciones reales"""
+    names = [s["name"] for s in stations]
+    ids = [s["id"] for s in stations]
+    return {
+        "stations": lambda: "/api/stations",
+        "lines": lambda: "/api/lines",
+        "line-geometries": lambda: "/api/line-geometries",
+        "station": lambda: "/api/station/" + quote(rng.choice(ids), safe=""),
+        "route": lambda: "/api/route?" + "&".join(
+            f"{k}={quote(v)}" for k, v in (("origin", rng.choice(names)), ("destination", rng.choice(names)))
+        ),
+    }
+
+
+async def timed_get(client: httpx.AsyncClient, url: str) -> Tuple[float, bool]:
+    start = time.perf_counter()
+    try:
+        resp = await client.get(url)
+        ok = resp.status_code < 400
+    except httpx.HTTPError:
+        ok = False
+    return (time.perf_counter() - start) * 1000, ok
+
+
+async def run_load(client, makers, total: int, concurrency: int, rng: random.Random):
+    kinds = list(MIX)
+    schedule = rng.choices(kinds, weights=[MIX[k] for k in kinds], k=total)
+    latencies: Dict[str, List[float]] = {k: [] for k in kinds}
+    errors: Dict[str, int] = {k: 0 for k in kinds}
+    position = 0
+
+    async def worker():
+        nonlocal position
+        while position < len(schedule):
+            kind = schedule[position]
+            position += 1
+            ms, ok = await timed_get(client, makers[kind]())
+            latencies[kind].append(ms)
+            if not ok:
+                errors[kind] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, errors, time.perf_counter() - start
+
+
+async def measure_allocations(client, makers, samples: int) -> Dict[str, Dict[str, float]]:
+    """Pico de memoria asignada y memoria retenida por petición (secuencial, con tracemalloc)"""
+    result = {}
+    tracemalloc.start()
+    try:
+        for kind, make in makers.items():
+            peaks, retained = [], []
+            for _ in range(samples):
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                await client.get(make())
+                current, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained.append(current - before)
+            result[kind] = {
+                "alloc_peak_kib": round(sum(peaks) / len(peaks) / 1024, 1),
+                "retained_kib": round(sum(retained) / len(retained) / 1024, 1),
+            }
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def summarize(latencies, errors, elapsed, allocations) -> Dict[str, Any]:
+    endpoints = {}
+    for kind, values in latencies.items():
+        values = sorted(values)
+        endpoints[kind] = {
+            "requests": len(values),
+            "errors": errors[kind],
+            "throughput_rps": round(len(values) / elapsed, 1) if elapsed else None,
+            "mean_ms": round(sum(values) / len(values), 3) if values else None,
+            "p50_ms": round(percentile(values, 50), 3) if values else None,
+            "p95_ms": round(percentile(values, 95), 3) if values else None,
+            "p99_ms": round(percentile(values, 99), 3) if values else None,
+            **allocations.get(kind, {}),
+        }
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "total_requests": total,
+        "total_errors": sum(errors.values()),
+        "elapsed_seconds": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 1) if elapsed else None,
+        "endpoints": endpoints,
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    config = report["config"]
+    print(f"\nBackend: {config['backend']}  concurrencia: {config['concurrency']}  "
+          f"peticiones: {report['total_requests']}  errores: {report['total_errors']}  "
+          f"{report['throughput_rps']} req/s")
+    header = f"{'endpoint':<16}{'n':>6}{'err':>5}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'alloc KiB':>11}"
+    print(header)
+    print("-" * len(header))
+    for kind, e in report["endpoints"].items():
+        alloc = e.get("alloc_peak_kib", "")
+        print(f"{kind:<16}{e['requests']:>6}{e['errors']:>5}{e['throughput_rps'] or 0:>9}"
+              f"{e['p50_ms'] or 0:>9.2f}{e['p95_ms'] or 0:>9.2f}{e['p99_ms'] or 0:>9.2f}{alloc:>11}")
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float,
+            min_delta_ms: float) -> bool:
+    """
+    Compara p50/p95 con la línea base; devuelve False si algún endpoint empeora
+    más del umbral relativo y, a la vez, más de ``min_delta_ms`` (las latencias
+    de menos de un milisegundo varían mucho de una ejecución a otra)
+    """
+    base_config = baseline.get("config", {})
+    for field, label in (("host", "otra máquina"), ("python", "otra versión de Python"),
+                         ("backend", "otro backend"), ("concurrency", "otra concurrencia")):
+        if base_config.get(field) != report["config"].get(field):
+            print(f"Aviso: la línea base se midió con {label}; regenérala con --save-baseline")
+    ok = True
+    print(f"\nComparación con la línea base (umbral +{max_regression:.0%} y +{min_delta_ms:g} ms)")
+    for kind, e in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(kind)
+        if not base:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms"):
+            if base.get(metric) and e.get(metric) is not None:
+                change = e[metric] / base[metric] - 1
+                changes.append(f"{metric[:-3]} {base[metric]:.2f} -> {e[metric]:.2f} ({change:+.0%})")
+                if change > max_regression and e[metric] - base[metric] > min_delta_ms:
+                    ok = False
+                    changes[-1] += " REGRESIÓN"
+        print(f"  {kind:<16}" + "   ".join(changes))
+    return ok
+
+
+async def benchmark(args) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    server = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30.0,
+                                   limits=httpx.Limits(max_connections=args.concurrency))
+        lifespan = None
+    else:
+        if args.backend == "stand-in":
+            server, endpoint = start_stand_in(args.data)
+            os.environ["SPARQL_ENDPOINT"] = endpoint
+            os.environ["SPARQL_BACKEND"] = "fuseki"
+        else:
+            os.environ["SPARQL_BACKEND"] = "embedded"
+            os.environ["SPARQL_DATA_FILE"] = str(args.data)
+        import app  # se importa aquí para que lea la configuración anterior
+
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app.app),
+                                   base_url="http://bench", timeout=30.0)
+        lifespan = app.app.router.lifespan_context(app.app)
+
+    try:
+        if lifespan is not None:
+            await lifespan.__aenter__()
+        stations = (await client.get("/api/stations")).raise_for_status().json()
+        makers = build_requests(stations, rng)
+        for make in makers.values():  # calentamiento: índices y cachés construidos
+            for _ in range(args.warmup):
+                await client.get(make())
+
+        latencies, errors, elapsed = await run_load(client, makers, args.requests, args.concurrency, rng)
+        allocations = {}
+        if args.alloc_samples and not args.url:
+            allocations = await measure_allocations(client, makers, args.alloc_samples)
+    finally:
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        await client.aclose()
+        if server is not None:
+            server.shutdown()
+
+    report = summarize(latencies, errors, elapsed, allocations)
+    report["config"] = {
+        "backend": args.url or args.backend,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "seed": args.seed,
+        "python": platform.python_version(),
+        "host": platform.node(),
+    }
+    return report
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de la API del metro (Grupo 01)")
+    parser.add_argument("--backend", choices=["embedded", "stand-in"], default="embedded",
+                        help="Origen de los datos para la API en proceso")
+    parser.add_argument("--url", help="Medir una API ya arrancada en esta URL")
+    parser.add_argument("--data", type=Path, default=DATA_FILE, help="Fichero RDF a cargar")
+    parser.add_argument("--requests", type=int, default=2000, help="Peticiones totales")
+    parser.add_argument("--concurrency", type=int, default=16, help="Peticiones simultáneas")
+    parser.add_argument("--warmup", type=int, default=2, help="Peticiones previas por endpoint")
+    parser.add_argument("--alloc-samples", type=int, default=20,
+                        help="Peticiones por endpoint para medir memoria (0 = no medir)")
+    parser.add_argument("--seed", type=int, default=1, help="Semilla del tráfico aleatorio")
+    parser.add_argument("--output", type=Path, help="Guardar el informe completo en JSON")
+    parser.add_argument("--save-baseline", type=Path, help="Guardar el informe como línea base")
+    parser.add_argument("--compare", type=Path, help="Línea base con la que comparar")
+    parser.add_argument("--max-regression", type=float, default=0.25,
+                        help="Empeoramiento relativo de p50/p95 tolerado al comparar")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0,
+                        help="Empeoramiento absoluto de p50/p95 (ms) por debajo del cual no hay regresión")
+    args = parser.parse_args()
+
+    report = asyncio.run(benchmark(args))
+    print_report(report)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+            print(f"Informe guardado en {path}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        if not compare(report, baseline, args.max_regression, args.min_delta_ms):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# backend/cache.py - Caché de respuestas JSON con ETag para los datos estáticos del dataset
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional
+    brotli = None
+
+from utils import query_sparql
+
+# Huella para detectar que el dataset de Fuseki se ha recargado: el número de triples,
+# que Fuseki cuenta sobre sus índices sin leer los valores. No ve un literal editado
+# sin cambiar el número de triples: si el dataset tiene un triple de versión o fecha de
+# modificación, mejor consultar ese (DATASET_FINGERPRINT_QUERY en app.py)
+FINGERPRINT_QUERY = "SELECT (COUNT(*) AS ?triples) WHERE { ?s ?p ?o }"
+
+
+class DatasetVersion:
+    """
+    Versión del dataset: cambia cuando se invalida a mano (bump) o cuando la
+    consulta de huella devuelve otro valor en su primera fila. La consulta
+    se lanza en segundo plano como mucho una vez cada ``check_interval``
+    segundos, y nunca dos a la vez; mientras tanto se sirve la versión conocida.
+    """
+
+    def __init__(self, check_interval: float, query: str = FINGERPRINT_QUERY):
+        self.check_interval = check_interval
+        self.query = query
+        self.version = 1
+        self.fingerprint: Optional[str] = None
+        self.checked_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def bump(self) -> int:
+        self.version += 1
+        # Despierta a quien espera en wait_changed y prepara el evento del siguiente cambio
+        self._changed.set()
+        self._changed = asyncio.Event()
+        return self.version
+
+    async def wait_changed(self, version: int) -> int:
+        """Espera hasta que la versión deje de ser ``version``"""
+        while self.version == version:
+            await self._changed.wait()
+        return self.version
+
+    async def check(self) -> bool:
+        """Consulta la huella del dataset; devuelve True si ha cambiado"""
+        self.checked_at = time.time()
+        data = await query_sparql(self.query)
+        bindings = data.get("results", {}).get("bindings", [])
+        fingerprint = None
+        if bindings:
+            variables = data.get("head", {}).get("vars", [])
+            fingerprint = ":".join(bindings[0].get(v, {}).get("value", "") for v in variables)
+        changed = self.fingerprint is not None and fingerprint != self.fingerprint
+        self.fingerprint = fingerprint
+        if changed:
+            self.bump()
+        return changed
+
+    async def _check_in_background(self) -> None:
+        try:
+            await self.check()
+        except Exception as e:
+            # Fuseki no responde: se sigue sirviendo la versión conocida
+            print(f"No se pudo comprobar la versión del dataset: {e}")
+
+    async def current(self) -> int:
+        """Versión conocida; si toca, lanza la comprobación de la huella sin esperarla"""
+        if (self.check_interval > 0 and time.time() - self.checked_at >= self.check_interval
+                and (self._task is None or self._task.done())):
+            self.checked_at = time.time()
+            self._task = asyncio.create_task(self._check_in_background())
+        return self.version
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+
+def accepted_encodings(header: str) -> Dict[str, float]:
+    """Codificaciones de una cabecera Accept-Encoding con su peso q (0 = rechazada)"""
+    weights: Dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[name] = weight
+    return weights
+
+
+class CachedResponse:
+    """Cuerpo JSON ya serializado (y comprimido) con su ETag"""
+
+    def __init__(self, value: Any):
+        self.body = json.dumps(jsonable_encoder(value), ensure_ascii=False,
+                               separators=(",", ":")).encode("utf-8")
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:20] + '"'
+        self.gzip = gzip.compress(self.body, compresslevel=6)
+        self.br = brotli.compress(self.body) if brotli is not None else None
+        self.created_at = time.time()
+
+
+class ResponseCache:
+    """Respuestas por (endpoint, versión del dataset), servidas con ETag/304"""
+
+    def __init__(self, dataset: DatasetVersion):
+        self.dataset = dataset
+        self.entries: Dict[Tuple[str, int], CachedResponse] = {}
+        self.hits = 0
+        self.misses = 0
+        self._locks: Dict[str, asyncio.Lock] = {}
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    async def get(self, key: str, producer: Callable[[], Awaitable[Any]]) -> CachedResponse:
+        version = await self.dataset.current()
+        entry = self.entries.get((key, version))
+        if entry is not None:
+            self.hits += 1
+            return entry
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self.entries.get((key, version))
+            if entry is None:
+                self.misses += 1
+                entry = CachedResponse(await producer())
+                # Las versiones antiguas de este endpoint ya no sirven
+                for old in [k for k in self.entries if k[0] == key]:
+                    del self.entries[old]
+                self.entries[(key, version)] = entry
+            else:
+                self.hits += 1
+        return entry
+
+    async def respond(self, request: Request, key: str,
+                      producer: Callable[[], Awaitable[Any]]) -> Response:
+        entry = await self.get(key, producer)
+        headers = {"ETag": entry.etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if entry.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+
+        # La codificación aceptada con más peso; a igualdad, brotli antes que gzip
+        weights = accepted_encodings(request.headers.get("accept-encoding", ""))
+        body, best = entry.body, 0.0
+        for name, encoded in (("br", entry.br), ("gzip", entry.gzip)):
+            weight = weights.get(name, weights.get("*", 0.0))
+            if encoded is not None and weight > best:
+                body, best, headers["Content-Encoding"] = encoded, weight, name
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "dataset_version": self.dataset.version,
+            "dataset_fingerprint": self.dataset.fingerprint,
+            "entries": len(self.entries),
+            "bytes": sum(len(e.body) for e in self.entries.values()),
+            "gzip_bytes": sum(len(e.gzip) for e in self.entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
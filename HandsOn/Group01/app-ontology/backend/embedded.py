@@ -0,0 +1,116 @@
+# backend/embedded.py - Almacén RDF en proceso (rdflib) para funcionar sin Fuseki
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException
+
+try:
+    from rdflib import Graph
+    from rdflib.plugins.sparql import prepareQuery
+except ImportError:  # rdflib solo hace falta con SPARQL_BACKEND=embedded
+    Graph = None
+    prepareQuery = None
+
+# Formato de serialización de rdflib para cada tipo MIME de CONSTRUCT/DESCRIBE
+GRAPH_FORMATS = {
+    "text/turtle": "turtle",
+    "application/n-triples": "nt",
+    "application/rdf+xml": "xml",
+    "application/ld+json": "json-ld",
+}
+
+
+# El parser SPARQL de rdflib (pyparsing) no admite dos análisis a la vez desde hilos distintos
+_parse_lock = threading.Lock()
+
+
+@lru_cache(maxsize=256)
+def _prepare(query: str):
+    """Parsear y traducir una consulta con rdflib es caro: se hace una vez por texto"""
+    with _parse_lock:
+        return prepareQuery(query)
+
+
+class EmbeddedStore:
+    """
+    Grafo rdflib cargado desde un fichero que responde las mismas consultas que
+    Fuseki. Las consultas se ejecutan en un pool de hilos para no bloquear el
+    bucle de eventos (el grafo solo se lee, nunca se modifica tras cargarlo)
+    """
+
+    def __init__(self, path: Path, max_workers: int = 4):
+        self.path = Path(path)
+        self.max_workers = max_workers
+        self.graph = None
+        self.load_seconds: Optional[float] = None
+        self.queries = 0
+        self.errors = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = asyncio.Lock()
+
+    def _load(self):
+        if Graph is None:
+            raise RuntimeError("El backend embebido necesita rdflib: pip install rdflib")
+        start = time.perf_counter()
+        graph = Graph()
+        graph.parse(str(self.path))
+        self.load_seconds = time.perf_counter() - start
+        return graph
+
+    def _run(self, query: str, response_format: str) -> Any:
+        result = self.graph.query(_prepare(query))
+        if result.type in ("SELECT", "ASK"):
+            return json.loads(result.serialize(format="json"))
+        # CONSTRUCT/DESCRIBE: texto en el formato pedido (Turtle por defecto), como Fuseki
+        fmt = GRAPH_FORMATS.get(response_format.split(";")[0].strip(), "turtle")
+        return result.graph.serialize(format=fmt)
+
+    async def open(self) -> None:
+        """Carga el fichero (una sola vez) fuera del bucle de eventos"""
+        async with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="sparql")
+            if self.graph is None:
+                loop = asyncio.get_running_loop()
+                self.graph = await loop.run_in_executor(self._executor, self._load)
+                print(f"Grafo embebido cargado: {len(self.graph)} triples en {self.load_seconds:.2f} s")
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    async def query(self, query: str, response_format: str) -> Any:
+        if self.graph is None or self._executor is None:
+            await self.open()
+        self.queries += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor, self._run, query, response_format)
+        except Exception as e:
+            self.errors += 1
+            raise HTTPException(
+                status_code=502,
+                detail={
+                    "error": "Error al ejecutar la consulta SPARQL",
+                    "details": str(e),
+                    "endpoint": f"embedded:{self.path.name}"
+                }
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "file": str(self.path),
+            "loaded": self.graph is not None,
+            "triples": len(self.graph) if self.graph is not None else 0,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "max_workers": self.max_workers,
+            "queries": self.queries,
+            "errors": self.errors,
+        }
@@ -0,0 +1,173 @@
+# backend/events.py - Aviso de cambios del dataset a los clientes por Server-Sent Events
+import asyncio
+import hashlib
+import json
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+
+from cache import DatasetVersion
+
+# Secciones cuyo delta incluye los registros nuevos; del resto solo se envían los ids
+RECORD_SECTIONS = ("stations", "lines")
+# Segundos sin eventos tras los que se envía un comentario para mantener viva la conexión
+HEARTBEAT_SECONDS = 15.0
+# Milisegundos que espera el navegador antes de reconectar
+RETRY_MS = 5000
+
+Snapshot = Dict[str, Dict[str, Any]]
+
+
+def digest(value: Any) -> str:
+    text = json.dumps(jsonable_encoder(value), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def diff_section(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, List[str]]:
+    """Ids añadidos, borrados y cambiados entre dos mapas id -> digest"""
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "changed": sorted(k for k in new.keys() & old.keys() if new[k] != old[k]),
+    }
+
+
+def format_event(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+
+class ChangeFeed:
+    """
+    Vigila la versión del dataset mientras haya clientes conectados y, en cada
+    cambio (detectado por la huella o por POST /api/cache/invalidate), envía
+    la nueva versión con las estaciones y líneas añadidas, cambiadas o borradas
+    """
+
+    def __init__(self, dataset: DatasetVersion, snapshot_loader: Callable[[], Awaitable[Snapshot]],
+                 history: int = 32, queue_size: int = 16):
+        self.dataset = dataset
+        self.snapshot_loader = snapshot_loader
+        self.queue_size = queue_size
+        self.digests: Optional[Dict[str, Dict[str, str]]] = None
+        self.published_version = dataset.version
+        self.history: deque = deque(maxlen=history)
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.events_sent = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _load_digests(self):
+        records = await self.snapshot_loader()
+        digests = {section: {key: digest(value) for key, value in items.items()}
+                   for section, items in records.items()}
+        return records, digests
+
+    async def _watch(self) -> None:
+        if self.digests is None:
+            try:
+                _, self.digests = await self._load_digests()
+                self.published_version = self.dataset.version
+            except Exception as e:
+                print(f"No se pudo tomar la foto inicial del dataset: {e}")
+        while True:
+            interval = self.dataset.check_interval or HEARTBEAT_SECONDS
+            try:
+                await asyncio.wait_for(self.dataset.wait_changed(self.published_version), interval)
+            except asyncio.TimeoutError:
+                # Lanza la comprobación de la huella en segundo plano (compartida con las
+                # peticiones); si detecta un cambio, wait_changed despierta en la siguiente vuelta
+                await self.dataset.current()
+            if self.dataset.version != self.published_version:
+                await self._publish_change()
+
+    async def _publish_change(self) -> None:
+        version = self.dataset.version
+        event: Dict[str, Any] = {"version": version, "previous_version": self.published_version}
+        try:
+            records, digests = await self._load_digests()
+        except Exception as e:
+            print(f"No se pudo calcular el cambio del dataset: {e}")
+            records, digests = None, None
+        if digests is None or self.digests is None:
+            event["resync"] = True
+        else:
+            for section, new in digests.items():
+                delta: Dict[str, Any] = diff_section(self.digests.get(section, {}), new)
+                if section in RECORD_SECTIONS:
+                    delta["records"] = {key: jsonable_encoder(records[section][key])
+                                        for key in delta["added"] + delta["changed"]}
+                event[section] = delta
+        self.digests = digests
+        self.published_version = version
+        self.history.append(event)
+        for queue in self.subscribers:
+            if queue.full():
+                # Cliente lento: se descartan sus eventos pendientes y se le pide recargar todo
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"version": version, "resync": True})
+            else:
+                queue.put_nowait(event)
+
+    def _missed_events(self, last_version: int) -> List[Dict[str, Any]]:
+        """Eventos posteriores a ``last_version``, o uno de resync si el historial no llega"""
+        current = self.published_version
+        if last_version == current:
+            return []
+        missed = [e for e in self.history if e["version"] > last_version]
+        if (last_version > current or not missed or missed[0]["previous_version"] != last_version
+                or any(e.get("resync") for e in missed)):
+            return [{"version": current, "resync": True}]
+        return missed
+
+    def _ensure_watcher(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+
+    async def stream(self, request: Request, last_version: Optional[int] = None) -> AsyncIterator[str]:
+        queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        self.subscribers.add(queue)
+        self._ensure_watcher()
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            yield format_event("version", {"version": self.published_version}, self.published_version)
+            if last_version is not None:
+                for event in self._missed_events(last_version):
+                    yield format_event("dataset", event, event["version"])
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": ping\n\n"
+                    continue
+                self.events_sent += 1
+                yield format_event("dataset", event, event["version"])
+        finally:
+            self.subscribers.discard(queue)
+            if not self.subscribers:
+                await self.close()
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "subscribers": len(self.subscribers),
+            "watching": self._task is not None and not self._task.done(),
+            "published_version": self.published_version,
+            "history": len(self.history),
+            "events_sent": self.events_sent,
+        }
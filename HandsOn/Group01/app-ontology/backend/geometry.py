@@ -0,0 +1,112 @@
+# backend/geometry.py - Decodificación rápida de WKT de líneas con NumPy
+import re
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_PARTS = re.compile(r"\(([^()]*)\)")
+# Dimensión declarada tras el tipo: "LINESTRING Z (...)", "MULTILINESTRING ZM ((...))"
+_DIMENSION = re.compile(r"^\s*[A-Za-z]+\s*(ZM|Z|M)?\s*\(", re.IGNORECASE)
+_NUMBER_SEPARATORS = str.maketrans(",", " ")
+
+
+def parse_multilinestring(wkt: str) -> List[np.ndarray]:
+    """
+    Parsea un MULTILINESTRING (o LINESTRING) WKT en una lista de arrays (n, 2)
+    con columnas [lat, lng], uno por cada parte de la geometría. Las
+    coordenadas Z y M se descartan; una parte cuyo número de valores no
+    corresponde a sus puntos lanza ValueError
+    Ejemplo: MULTILINESTRING ((2.168 41.373, 2.165 41.370), (2.1 41.3, 2.2 41.4))
+    """
+    match = _DIMENSION.match(wkt)
+    declared = len(match.group(1)) + 2 if match and match.group(1) else None
+    parts = []
+    for text in _PARTS.findall(wkt):
+        if not text.strip() or text.strip().upper() == "EMPTY":
+            continue
+        values = np.array(text.translate(_NUMBER_SEPARATORS).split(), dtype=np.float64)
+        points = text.count(",") + 1
+        # Sin dimensión declarada, "x y z" sin Z también es válido (algunos productores lo escriben así)
+        dimension = declared or values.size // points
+        if dimension not in (2, 3, 4) or values.size != points * dimension:
+            raise ValueError(f"Parte WKT con {values.size} valores para {points} puntos: ({text[:80]})")
+        # WKT es "lon lat [z] [m]": se queda con lon/lat y se invierten para devolver [lat, lng]
+        parts.append(values.reshape(points, dimension)[:, 1::-1].copy())
+    return parts
+
+
+@lru_cache(maxsize=128)
+def parse_multilinestring_cached(wkt: str) -> Tuple[np.ndarray, ...]:
+    """parse_multilinestring memorizado: cada WKT se decodifica una vez para todos los formatos"""
+    return tuple(parse_multilinestring(wkt))
+
+
+def tolerance_for_zoom(zoom: int) -> float:
+    """Tolerancia en grados equivalente a ~1 píxel en el zoom dado (teselas de 256 px)"""
+    return 360.0 / (256 * 2 ** zoom)
+
+
+def simplify(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """Douglas-Peucker iterativo; las distancias de cada tramo se calculan vectorizadas"""
+    n = len(points)
+    if n < 3 or tolerance <= 0:
+        return points
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        segment = end - start
+        inner = points[first + 1:last] - start
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            middle = first + 1 + index
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return points[keep]
+
+
+def encode_polyline(points: np.ndarray, precision: int = 5) -> str:
+    """Codifica [lat, lng] con el algoritmo de polilíneas de Google (el de Leaflet/OSRM)"""
+    if len(points) == 0:
+        return ""
+    scaled = np.round(points * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    values = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+    chars = []
+    for value in values.tolist():
+        while value >= 0x20:
+            chars.append(chr((0x20 | (value & 0x1F)) + 63))
+            value >>= 5
+        chars.append(chr(value + 63))
+    return "".join(chars)
+
+
+def encode_parts(parts: List[np.ndarray], fmt: str, zoom: Optional[int] = None, decimals: int = 6):
+    """
+    Devuelve las partes en el formato pedido:
+      objects   lista plana de {lat, lng} (formato original, sin límites entre partes)
+      parts     una lista de [lat, lng] por parte
+      flat      una lista [lat, lng, lat, lng, ...] por parte
+      polyline  una cadena codificada por parte
+    """
+    if zoom is not None:
+        tolerance = tolerance_for_zoom(zoom)
+        parts = [simplify(p, tolerance) for p in parts]
+    if fmt == "polyline":
+        return [encode_polyline(p) for p in parts]
+    if fmt == "flat":
+        return [np.round(p, decimals).ravel().tolist() for p in parts]
+    if fmt == "parts":
+        return [np.round(p, decimals).tolist() for p in parts]
+    return [{"lat": lat, "lng": lng} for p in parts for lat, lng in p.tolist()]
@@ -0,0 +1,260 @@
+# backend/sparql_proxy.py - Caché, agrupación y métricas del proxy SPARQL (/api/query)
+import asyncio
+import bisect
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Límites de los cubos del histograma de latencia (ms); el último cubo es +inf
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def normalize_query(query: str) -> str:
+    """
+    Colapsa espacios y quita comentarios fuera de literales e IRIs, para que
+    la misma consulta escrita con otro formato tenga la misma clave
+    """
+    out = []
+    i, n = 0, len(query)
+    pending_space = False
+    while i < n:
+        c = query[i]
+        if c == "#":
+            newline = query.find("\n", i)
+            i = n if newline == -1 else newline
+            continue
+        if c.isspace():
+            pending_space = True
+            i += 1
+            continue
+
+        end = i + 1
+        if c == "<":
+            # IRI si se cierra con ">" antes de un espacio; si no, operador < o <=
+            while end < n and query[end] not in "> \t\r\n":
+                end += 1
+            end = end + 1 if end < n and query[end] == ">" else i + 1
+        elif c in "\"'":
+            if query.startswith(c * 3, i):
+                close = query.find(c * 3, i + 3)
+                end = n if close == -1 else close + 3
+            else:
+                while end < n and query[end] != c:
+                    end += 2 if query[end] == "\\" else 1
+                end = min(end + 1, n)
+        if pending_space and out:
+            out.append(" ")
+        pending_space = False
+        out.append(query[i:end])
+        i = end
+    return "".join(out)
+
+
+def media_type(response_format: str, is_json: bool) -> str:
+    """Tipo MIME de la respuesta: el formato pedido si el cuerpo está en ese formato"""
+    mime = response_format.split(";")[0].strip().lower()
+    if not re.fullmatch(r"[\w.+-]+/[\w.+-]+", mime):
+        mime = ""
+    if is_json:
+        return mime if mime.endswith("json") else "application/json"
+    return mime or "text/plain"
+
+
+def query_key(query: str, response_format: str, version: int) -> str:
+    text = f"{version}\n{response_format}\n{normalize_query(query)}"
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+class QueryCache:
+    """
+    LRU con caducidad (TTL) y límite de memoria en bytes de los cuerpos
+    guardados; cada entrada es (cuerpo, tipo MIME)
+    """
+
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries: "OrderedDict[str, Tuple[float, bytes, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, str]]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        created, body, mime = entry
+        if time.time() - created > self.ttl:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return body, mime
+
+    def put(self, key: str, body: bytes, mime: str) -> None:
+        if len(body) > self.max_bytes:
+            return  # no cabe: no se cachea
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.time(), body, mime)
+        self.bytes += len(body)
+        while self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.bytes = 0
+
+    def _remove(self, key: str) -> None:
+        _, body, _ = self.entries.pop(key)
+        self.bytes -= len(body)
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+        self.count = 0
+
+    def observe(self, ms: float) -> None:
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total_ms += ms
+        self.count += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        buckets = {f"le_{b}": c for b, c in zip(LATENCY_BUCKETS_MS, self.counts)}
+        buckets["le_inf"] = self.counts[-1]
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "buckets": buckets,
+        }
+
+
+class QueryStats:
+    def __init__(self, query: str):
+        self.preview = " ".join(query.split())[:160]
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.upstream = LatencyHistogram()
+        self.last_seen = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "query": self.preview,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "upstream_latency": self.upstream.to_dict(),
+        }
+
+
+class SparqlProxy:
+    """
+    Ejecuta consultas contra Fuseki con caché, agrupando peticiones idénticas
+    en vuelo en una sola consulta y limitando las consultas simultáneas
+    """
+
+    def __init__(self, runner: Callable[[str, str], Awaitable[Any]], ttl: float,
+                 max_bytes: int, max_concurrent: int, max_tracked_queries: int = 500):
+        self.runner = runner
+        self.cache = QueryCache(ttl, max_bytes)
+        self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
+        self.max_tracked_queries = max_tracked_queries
+        self.in_flight: Dict[str, asyncio.Task] = {}
+        self.stats: "OrderedDict[str, QueryStats]" = OrderedDict()
+        self.totals = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0}
+        self.upstream = LatencyHistogram()
+
+    def _stats_for(self, key: str, query: str) -> QueryStats:
+        stats = self.stats.get(key)
+        if stats is None:
+            stats = self.stats[key] = QueryStats(query)
+            if len(self.stats) > self.max_tracked_queries:
+                self.stats.popitem(last=False)
+        self.stats.move_to_end(key)
+        stats.last_seen = time.time()
+        return stats
+
+    def _count(self, stats: QueryStats, counter: str) -> None:
+        setattr(stats, counter, getattr(stats, counter) + 1)
+        self.totals[counter] += 1
+
+    async def execute(self, query: str, response_format: str, version: int) -> Tuple[bytes, str]:
+        """
+        Devuelve el cuerpo de la respuesta y su tipo MIME (de caché, de otra
+        petición o de Fuseki). La consulta a Fuseki corre en su propia tarea: si se cancela
+        la petición que la lanzó, las demás que la esperan siguen recibiéndola
+        """
+        key = query_key(query, response_format, version)
+        stats = self._stats_for(key, query)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self._count(stats, "hits")
+            return cached
+
+        task = self.in_flight.get(key)
+        if task is not None:
+            self._count(stats, "coalesced")
+        else:
+            self._count(stats, "misses")
+            task = asyncio.create_task(self._fetch(key, query, response_format, stats))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: str, query: str, response_format: str,
+                     stats: QueryStats) -> Tuple[bytes, str]:
+        try:
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await self.runner(query, response_format)
+                finally:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    stats.upstream.observe(elapsed)
+                    self.upstream.observe(elapsed)
+        except BaseException:
+            self._count(stats, "errors")
+            raise
+        # Resultados JSON (SELECT/ASK) o texto en el formato pedido (CONSTRUCT/DESCRIBE)
+        if isinstance(result, str):
+            body = result.encode("utf-8")
+        else:
+            body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        mime = media_type(response_format, not isinstance(result, str))
+        self.cache.put(key, body, mime)
+        return body, mime
+
+    def _finished(self, key: str, task: asyncio.Task) -> None:
+        if self.in_flight.get(key) is task:
+            del self.in_flight[key]
+        if not task.cancelled():
+            task.exception()  # marcada como recuperada si nadie la esperaba ya
+
+    def metrics(self, detail: bool = False) -> Dict[str, Any]:
+        """
+        Totales del proxy; con ``detail`` también las consultas seguidas, que
+        incluyen el comienzo del texto de cada una (solo para administración)
+        """
+        metrics = {
+            "cache": {
+                "entries": len(self.cache.entries),
+                "bytes": self.cache.bytes,
+                "max_bytes": self.cache.max_bytes,
+                "ttl_seconds": self.cache.ttl,
+            },
+            "in_flight": len(self.in_flight),
+            "max_concurrent": self.max_concurrent,
+            "upstream_latency": self.upstream.to_dict(),
+            "requests": dict(self.totals),
+            "tracked_queries": len(self.stats),
+        }
+        if detail:
+            metrics["queries"] = {key: s.to_dict() for key, s in reversed(self.stats.items())}
+        return metrics
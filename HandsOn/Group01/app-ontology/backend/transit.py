@@ -0,0 +1,483 @@
+# backend/transit.py - Índice en memoria de la red de metro para el cálculo de rutas
+import asyncio
+import heapq
+import math
+import sys
+import time
+from array import array
+from collections import deque
+from typing import Optional, List, Dict, Any, Tuple, Callable, Awaitable
+
+from utils import parse_point_wkt
+
+NETWORK_QUERY = """
+PREFIX metro: <https://data.example.org/transport/bcn/metro/ontology#>
+PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+PREFIX geo: <http://www.opengis.net/ont/geosparql#>
+
+SELECT ?station ?stationName ?lineCode ?order ?lineGeometry ?stationGeometry
+WHERE {
+  ?station a metro:Station ;
+           rdfs:label ?stationName .
+  ?accessPoint metro:relatesTo ?station ;
+               metro:onLine ?line ;
+               metro:stationOrder ?order .
+  ?line metro:lineCode ?lineCode .
+  OPTIONAL { ?line metro:hasGeometry ?lineGeometry }
+  OPTIONAL { ?station metro:hasGeometry ?stationGeometry }
+}
+ORDER BY ?lineCode ?order
+"""
+
+# Penalización (en metros equivalentes) por cada cambio de línea
+DEFAULT_TRANSFER_PENALTY_M = 1500.0
+EARTH_RADIUS_M = 6371000.0
+_SOURCE = -1
+
+
+def haversine_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Distancia en metros entre dos puntos (lat, lng)"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+class TransitNetwork:
+    """
+    Red de metro compacta: estaciones (por nombre) con ids enteros y
+    adyacencia en formato CSR (offsets + destinos + línea de cada arista)
+    """
+
+    def __init__(self, bindings: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        self.names: List[str] = []
+        self.uris: List[str] = []
+        self.coords: List[Optional[Tuple[float, float]]] = []
+        self.station_ids: Dict[str, int] = {}
+        self.line_codes: List[str] = []
+        self.line_geometries: Dict[str, str] = {}
+        # Datos por URI para el detalle de estaciones (/api/stations/details)
+        self.uri_names: Dict[str, str] = {}
+        self.uri_lines: Dict[str, List[str]] = {}
+
+        line_ids: Dict[str, int] = {}
+        line_stations: Dict[int, Dict[int, int]] = {}
+        uri_coords: Dict[str, Tuple[float, float]] = {}
+
+        for binding in bindings:
+            station_uri = binding.get("station", {}).get("value", "")
+            station_name = binding.get("stationName", {}).get("value", "")
+            line_code = str(binding.get("lineCode", {}).get("value", ""))
+            order = int(binding.get("order", {}).get("value", 0))
+            line_geom = binding.get("lineGeometry", {}).get("value", "")
+            station_geom = binding.get("stationGeometry", {}).get("value", "")
+
+            sid = self.station_ids.get(station_name)
+            if sid is None:
+                sid = self.station_ids[station_name] = len(self.names)
+                self.names.append(station_name)
+                self.uris.append(station_uri)
+            lid = line_ids.get(line_code)
+            if lid is None:
+                lid = line_ids[line_code] = len(self.line_codes)
+                self.line_codes.append(line_code)
+                line_stations[lid] = {}
+            self.uri_names.setdefault(station_uri, station_name)
+            uri_lines = self.uri_lines.setdefault(station_uri, [])
+            if line_code not in uri_lines:
+                uri_lines.append(line_code)
+
+            # Cada estación una sola vez por línea, con su menor orden
+            stations = line_stations[lid]
+            if sid not in stations or order < stations[sid]:
+                stations[sid] = order
+
+            if station_geom and station_uri not in uri_coords:
+                coords = parse_point_wkt(station_geom)
+                if coords:
+                    uri_coords[station_uri] = (coords["lat"], coords["lng"])
+            if line_geom and line_code not in self.line_geometries:
+                self.line_geometries[line_code] = line_geom
+
+        self.coords = [uri_coords.get(uri) for uri in self.uris]
+        self.uri_coords = uri_coords
+
+        # Aristas entre estaciones consecutivas de cada línea, en ambos sentidos
+        neighbours: List[List[Tuple[int, int]]] = [[] for _ in self.names]
+        for lid, stations in line_stations.items():
+            ordered = sorted(stations, key=stations.get)
+            for a, b in zip(ordered, ordered[1:]):
+                neighbours[a].append((b, lid))
+                neighbours[b].append((a, lid))
+
+        self.adj_offsets = array("I", [0])
+        self.adj_targets = array("I")
+        self.adj_lines = array("H")
+        self.adj_weights = array("d")
+        for sid, edges in enumerate(neighbours):
+            for target, lid in edges:
+                self.adj_targets.append(target)
+                self.adj_lines.append(lid)
+                a, b = self.coords[sid], self.coords[target]
+                self.adj_weights.append(haversine_m(a, b) if a and b else math.nan)
+            self.adj_offsets.append(len(self.adj_targets))
+        # Tramos sin coordenadas: longitud media de los demás. Se guardan los que
+        # salen de una estación con coordenadas para acotar la heurística de A*
+        known = [w for w in self.adj_weights if not math.isnan(w)]
+        fallback = sum(known) / len(known) if known else 1.0
+        self.estimated_edges: List[Tuple[int, float]] = []
+        for sid in range(len(self.names)):
+            for i in range(self.adj_offsets[sid], self.adj_offsets[sid + 1]):
+                if math.isnan(self.adj_weights[i]):
+                    self.adj_weights[i] = fallback
+                    if self.coords[sid]:
+                        self.estimated_edges.append((sid, fallback))
+
+        self.station_lines: List[Tuple[int, ...]] = [
+            tuple(sorted({lid for _, lid in edges})) for edges in neighbours
+        ]
+
+        self.build_seconds = time.perf_counter() - start
+        self.built_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamaño del índice y tiempo de construcción"""
+        arrays = (self.adj_offsets, self.adj_targets, self.adj_lines, self.adj_weights)
+        return {
+            "stations": len(self.names),
+            "edges": len(self.adj_targets),
+            "lines": len(self.line_codes),
+            "adjacency_bytes": sum(a.itemsize * len(a) for a in arrays),
+            "approx_bytes": sum(sys.getsizeof(x) for x in arrays)
+            + sum(sys.getsizeof(s) for s in self.names + self.uris)
+            + sum(sys.getsizeof(g) for g in self.line_geometries.values()),
+            "build_ms": round(self.build_seconds * 1000, 3),
+            "built_at": self.built_at,
+            "age_seconds": round(time.time() - self.built_at, 1),
+        }
+
+    def station_summary(self, uri: str) -> Optional[Dict[str, Any]]:
+        """Nombre, coordenadas y líneas de una estación por URI, o None si no está en el índice"""
+        name = self.uri_names.get(uri)
+        if name is None:
+            return None
+        coords = self.uri_coords.get(uri)
+        return {
+            "id": uri,
+            "name": name,
+            "latitude": coords[0] if coords else None,
+            "longitude": coords[1] if coords else None,
+            "lines": list(self.uri_lines[uri]),
+        }
+
+    def shortest_path(self, origin: int, destination: int) -> Optional[Tuple[List[int], List[int]]]:
+        """BFS con punteros al padre: devuelve (estaciones, líneas de cada tramo)"""
+        parent = array("i", [-1]) * len(self.names)
+        parent_line = array("i", [-1]) * len(self.names)
+        parent[origin] = origin
+        queue = deque([origin])
+        offsets, targets, lines = self.adj_offsets, self.adj_targets, self.adj_lines
+
+        while queue:
+            current = queue.popleft()
+            if current == destination:
+                path, path_lines = [current], []
+                while current != origin:
+                    path_lines.append(parent_line[current])
+                    current = parent[current]
+                    path.append(current)
+                path.reverse()
+                path_lines.reverse()
+                return path, path_lines
+            for i in range(offsets[current], offsets[current + 1]):
+                neighbour = targets[i]
+                if parent[neighbour] == -1:
+                    parent[neighbour] = current
+                    parent_line[neighbour] = lines[i]
+                    queue.append(neighbour)
+        return None
+
+    def route(self, origin: str, destination: str) -> Dict[str, Any]:
+        """Ruta con menos paradas entre dos estaciones, en el formato de /api/route"""
+        if origin not in self.station_ids:
+            return {"found": False, "error": f"Estación origen '{origin}' no encontrada"}
+        if destination not in self.station_ids:
+            return {"found": False, "error": f"Estación destino '{destination}' no encontrada"}
+
+        result = self.shortest_path(self.station_ids[origin], self.station_ids[destination])
+        if result is None:
+            return {"found": False, "error": "No se encontró ruta entre las estaciones"}
+        path, path_lines = result
+        return self.route_response(path, [self.line_codes[lid] for lid in path_lines])
+
+    # --- Rutas ponderadas: A* sobre estados (estación, línea) ---
+
+    def _state(self, sid: int, lid: int) -> int:
+        return sid * len(self.line_codes) + lid
+
+    def _successors(self, state: int, penalty: float, origin: int):
+        """Aristas salientes de un estado: seguir en la línea o transbordar"""
+        if state == _SOURCE:
+            for lid in self.station_lines[origin]:
+                yield self._state(origin, lid), 0.0
+            return
+        sid, lid = divmod(state, len(self.line_codes))
+        for i in range(self.adj_offsets[sid], self.adj_offsets[sid + 1]):
+            if self.adj_lines[i] == lid:
+                yield self._state(self.adj_targets[i], lid), self.adj_weights[i]
+        for other in self.station_lines[sid]:
+            if other != lid:
+                yield self._state(sid, other), penalty
+
+    def _heuristic(self, destination: int) -> List[float]:
+        """
+        Cota inferior consistente del coste hasta el destino por estación: la
+        distancia en línea recta, rebajada lo necesario para que ningún tramo de
+        longitud estimada (sin coordenadas) la haga decrecer más que su peso
+        """
+        target = self.coords[destination]
+        if target is None:
+            return [0.0] * len(self.names)
+        heuristic = [haversine_m(c, target) if c else 0.0 for c in self.coords]
+        offset = max((heuristic[sid] - w for sid, w in self.estimated_edges), default=0.0)
+        if offset > 0:
+            heuristic = [max(0.0, h - offset) for h in heuristic]
+        return heuristic
+
+    def _astar(self, start: int, origin: int, destination: int, penalty: float,
+               heuristic: List[float], banned_stations=frozenset(), banned_moves=frozenset()):
+        """
+        A* desde ``start``; devuelve (coste, estados) hasta la primera llegada a
+        destino sin pasar por ``banned_stations`` ni por los tramos (estación,
+        estación) de ``banned_moves``
+        """
+        lines = len(self.line_codes)
+        best = {start: 0.0}
+        parent = {start: None}
+        h_start = 0.0 if start == _SOURCE else heuristic[start // lines]
+        heap = [(h_start, 0.0, start)]
+        while heap:
+            _, g, state = heapq.heappop(heap)
+            if g > best[state]:
+                continue
+            if state != _SOURCE and state // lines == destination:
+                states = []
+                while state is not None:
+                    states.append(state)
+                    state = parent[state]
+                states.reverse()
+                return g, states
+            for nxt, cost in self._successors(state, penalty, origin):
+                station = nxt // lines
+                if station in banned_stations:
+                    continue
+                if state != _SOURCE and (state // lines, station) in banned_moves:
+                    continue
+                ng = g + cost
+                if ng < best.get(nxt, math.inf):
+                    best[nxt] = ng
+                    parent[nxt] = state
+                    heapq.heappush(heap, (ng + heuristic[nxt // lines], ng, nxt))
+        return None
+
+    def _to_route(self, states: List[int]) -> Tuple[List[int], List[str]]:
+        """Convierte estados en estaciones y línea de cada tramo (los transbordos no son tramos)"""
+        lines = len(self.line_codes)
+        path, path_lines = [], []
+        for state in states[1:]:
+            sid, lid = divmod(state, lines)
+            if path and path[-1] == sid:
+                continue
+            if path:
+                path_lines.append(self.line_codes[lid])
+            path.append(sid)
+        return path, path_lines
+
+    def _assign_lines(self, path: List[int], penalty: float) -> Tuple[float, List[int]]:
+        """Asignación de líneas más barata para una secuencia de estaciones: (coste, estados)"""
+        layers: List[Dict[int, Tuple[float, Optional[int]]]] = []  # por tramo: línea -> (coste, línea anterior)
+        for a, b in zip(path, path[1:]):
+            layer = {}
+            for i in range(self.adj_offsets[a], self.adj_offsets[a + 1]):
+                if self.adj_targets[i] != b:
+                    continue
+                lid, weight = self.adj_lines[i], self.adj_weights[i]
+                if not layers:
+                    layer[lid] = (weight, None)
+                else:
+                    layer[lid] = min((cost + (0.0 if prev == lid else penalty) + weight, prev)
+                                     for prev, (cost, _) in layers[-1].items())
+            layers.append(layer)
+
+        lid = min(layers[-1], key=lambda l: layers[-1][l][0])
+        cost = layers[-1][lid][0]
+        segment_lines = []
+        for layer in reversed(layers):
+            segment_lines.append(lid)
+            lid = layer[lid][1]
+        segment_lines.reverse()
+
+        states = [_SOURCE, self._state(path[0], segment_lines[0])]
+        for j in range(1, len(path)):
+            states.append(self._state(path[j], segment_lines[j - 1]))
+            if j < len(segment_lines) and segment_lines[j] != segment_lines[j - 1]:
+                states.append(self._state(path[j], segment_lines[j]))
+        return cost, states
+
+    def k_shortest_paths(self, origin: int, destination: int, k: int = 1,
+                         penalty: float = DEFAULT_TRANSFER_PENALTY_M) -> List[Tuple[float, List[int]]]:
+        """
+        Algoritmo de Yen con A* como búsqueda base: hasta k rutas sin ciclos con
+        secuencias de estaciones distintas, de menor a mayor coste, cada una con
+        su asignación de líneas más barata
+        """
+        lines = len(self.line_codes)
+        heuristic = self._heuristic(destination)
+        first = self._astar(_SOURCE, origin, destination, penalty, heuristic)
+        if first is None:
+            return []
+        found = [first]
+        found_paths = [self._to_route(first[1])[0]]
+        seen = {tuple(found_paths[0])}
+        candidates = []
+        while len(found) < k:
+            _, previous = found[-1]
+            for i in range(len(previous) - 1):
+                # Un desvío por estación, desde el estado de llegada (el origen, desde la fuente)
+                if i == 1 or (i > 1 and previous[i - 1] // lines == previous[i] // lines):
+                    continue
+                spur, root = previous[i], previous[:i + 1]
+                root_path = self._to_route(root)[0] or [origin]
+                banned_moves = {(root_path[-1], path[len(root_path)]) for path in found_paths
+                                if path[:len(root_path)] == root_path and len(path) > len(root_path)}
+                spur_path = self._astar(spur, origin, destination, penalty, heuristic,
+                                        frozenset(root_path[:-1]), banned_moves)
+                if spur_path is None:
+                    continue
+                key = self._route_key(root[:-1] + spur_path[1])
+                if key is None or key in seen:
+                    continue
+                heapq.heappush(candidates, self._assign_lines(list(key), penalty))
+            # Una misma secuencia puede llegar por varias raíces: vale la más barata
+            while candidates:
+                cost, states = heapq.heappop(candidates)
+                path = self._to_route(states)[0]
+                if tuple(path) not in seen:
+                    seen.add(tuple(path))
+                    found.append((cost, states))
+                    found_paths.append(path)
+                    break
+            else:
+                break
+        return found
+
+    def _route_key(self, states: List[int]) -> Optional[Tuple[int, ...]]:
+        """Identifica una ruta por su secuencia de estaciones; None si no tiene sentido para un viajero"""
+        lines = len(self.line_codes)
+        if len(states) > 2 and states[1] // lines == states[2] // lines:
+            return None  # transbordo en la estación de origen
+        path, _ = self._to_route(states)
+        if len(set(path)) != len(path):
+            return None  # pasa dos veces por la misma estación
+        return tuple(path)
+
+    def weighted_route(self, origin: str, destination: str, k: int = 1,
+                       transfer_penalty: float = DEFAULT_TRANSFER_PENALTY_M) -> Dict[str, Any]:
+        """Ruta más corta por distancia (haversine) más penalización por transbordo, y alternativas"""
+        if origin not in self.station_ids:
+            return {"found": False, "error": f"Estación origen '{origin}' no encontrada"}
+        if destination not in self.station_ids:
+            return {"found": False, "error": f"Estación destino '{destination}' no encontrada"}
+
+        origin_id, destination_id = self.station_ids[origin], self.station_ids[destination]
+        if origin_id == destination_id:
+            return self.route_response([origin_id], [])
+        paths = self.k_shortest_paths(origin_id, destination_id, k, transfer_penalty)
+        if not paths:
+            return {"found": False, "error": "No se encontró ruta entre las estaciones"}
+
+        routes = []
+        for cost, states in paths:
+            path, path_lines = self._to_route(states)
+            route = self.route_response(path, path_lines)
+            route["distance_m"] = round(sum(
+                haversine_m(self.coords[a], self.coords[b])
+                for a, b in zip(path, path[1:]) if self.coords[a] and self.coords[b]), 1)
+            route["cost"] = round(cost, 1)
+            routes.append(route)
+        best = routes[0]
+        best["alternatives"] = routes[1:]
+        return best
+
+    def route_response(self, path: List[int], lines: List[str]) -> Dict[str, Any]:
+        route_stations = []
+        route_segments = []
+        for i, sid in enumerate(path):
+            route_stations.append({"name": self.names[sid], "uri": self.uris[sid]})
+            if i < len(path) - 1:
+                line_code = lines[i]
+                next_sid = path[i + 1]
+                segment_info = {
+                    "line_code": line_code,
+                    "from_station": self.names[sid],
+                    "to_station": self.names[next_sid]
+                }
+                current_coords = self.coords[sid]
+                next_coords = self.coords[next_sid]
+                if line_code in self.line_geometries and current_coords and next_coords:
+                    segment_info["geometry"] = self.line_geometries[line_code]
+                    segment_info["from_coords"] = current_coords
+                    segment_info["to_coords"] = next_coords
+                route_segments.append(segment_info)
+
+        # Calcular transbordos
+        transfers = []
+        current_line = None
+        for i, line_code in enumerate(lines):
+            if current_line and current_line != line_code:
+                transfers.append({
+                    "station": self.names[path[i]],
+                    "from_line": current_line,
+                    "to_line": line_code
+                })
+            current_line = line_code
+
+        return {
+            "found": True,
+            "stations": route_stations,
+            "lines": lines,
+            "segments": route_segments,
+            "transfers": transfers,
+            "num_stations": len(route_stations),
+            "num_transfers": len(transfers)
+        }
+
+
+class NetworkIndex:
+    """
+    Guarda la red construida y la reconstruye cuando caduca (TTL) o bajo demanda.
+    Un lock evita que varias peticiones la reconstruyan a la vez.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[List[Dict[str, Any]]]], ttl: float):
+        self.loader = loader
+        self.ttl = ttl
+        self.network: Optional[TransitNetwork] = None
+        self._lock = asyncio.Lock()
+
+    def is_stale(self) -> bool:
+        return self.network is None or (self.ttl > 0 and time.time() - self.network.built_at > self.ttl)
+
+    async def refresh(self) -> TransitNetwork:
+        async with self._lock:
+            bindings = await self.loader()
+            self.network = TransitNetwork(bindings)
+            return self.network
+
+    async def get(self) -> TransitNetwork:
+        if self.is_stale():
+            async with self._lock:
+                if self.is_stale():
+                    self.network = TransitNetwork(await self.loader())
+        return self.network
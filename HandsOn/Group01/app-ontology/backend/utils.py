@@ -1,23 +1,126 @@
 # backend/utils.py - Utilidades y funciones auxiliares
+import os
 import re
+from pathlib import Path
 from typing import Optional, List, Dict, Any
 from fastapi import HTTPException
 import httpx
 
-SPARQL_ENDPOINT = "http://localhost:3030/dataset/sparql"
+from geometry import parse_multilinestring, encode_parts
+from embedded import EmbeddedStore
+
+SPARQL_ENDPOINT = os.environ.get("SPARQL_ENDPOINT", "http://localhost:3030/dataset/sparql")
+SPARQL_TIMEOUT = 20.0
+
+# Backend de consultas: "fuseki" (HTTP, por defecto) o "embedded" (rdflib en proceso)
+SPARQL_BACKEND = os.environ.get("SPARQL_BACKEND", "fuseki").lower()
+SPARQL_DATA_FILE = Path(os.environ.get(
+    "SPARQL_DATA_FILE",
+    Path(__file__).resolve().parent.parent.parent / "rdf" / "metro-with-links.ttl",
+))
+SPARQL_EMBEDDED_WORKERS = int(os.environ.get("SPARQL_EMBEDDED_WORKERS", "4"))
+
+# Pool de conexiones HTTP compartido con Fuseki (configurable por entorno)
+POOL_MAX_CONNECTIONS = int(os.environ.get("SPARQL_POOL_MAX_CONNECTIONS", "20"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("SPARQL_POOL_MAX_KEEPALIVE", "10"))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("SPARQL_POOL_KEEPALIVE_EXPIRY", "30"))
+
+_client: Optional[httpx.AsyncClient] = None
+# Contadores propios: el pool de httpx/httpcore no tiene API pública de estado
+_client_stats = {"requests": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0}
+_store: Optional[EmbeddedStore] = None
+
+
+def http2_available() -> bool:
+    """HTTP/2 solo se activa si está instalado el paquete h2 (httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def open_client() -> httpx.AsyncClient:
+    """Crea el cliente HTTP de la aplicación (se llama desde el lifespan)"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=SPARQL_TIMEOUT,
+            http2=http2_available(),
+            limits=httpx.Limits(
+                max_connections=POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=POOL_MAX_KEEPALIVE,
+                keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+            ),
+        )
+    return _client
+
+
+async def close_client() -> None:
+    """Cierra el cliente compartido y sus conexiones abiertas"""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """Devuelve el cliente compartido, creándolo si el lifespan no se ejecutó"""
+    return open_client()
+
+
+def embedded_enabled() -> bool:
+    return SPARQL_BACKEND == "embedded"
+
+
+def get_store() -> EmbeddedStore:
+    """Devuelve el almacén embebido (se carga en el lifespan o en la primera consulta)"""
+    global _store
+    if _store is None:
+        _store = EmbeddedStore(SPARQL_DATA_FILE, SPARQL_EMBEDDED_WORKERS)
+    return _store
+
+
+def close_store() -> None:
+    if _store is not None:
+        _store.close()
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Estadísticas del pool de conexiones para /api/health"""
+    stats = {
+        "max_connections": POOL_MAX_CONNECTIONS,
+        "max_keepalive_connections": POOL_MAX_KEEPALIVE,
+        "keepalive_expiry": POOL_KEEPALIVE_EXPIRY,
+        "http2": http2_available(),
+        "requests": _client_stats["requests"],
+        "errors": _client_stats["errors"],
+        "in_flight": _client_stats["in_flight"],
+        "peak_in_flight": _client_stats["peak_in_flight"],
+    }
+    return stats
 
 
 def parse_point_wkt(wkt: str) -> Optional[Dict[str, float]]:
     """
-    Parsea un POINT WKT y devuelve {lat, lng}
+    Parsea un POINT WKT y devuelve {lat, lng} (descarta Z y M si las tiene)
     Ejemplo: POINT (2.107241921905464 41.344677306491334)
     """
     try:
-        pattern = r'POINT\s*\(\s*([\d.]+)\s+([\d.]+)\s*\)'
-        match = re.search(pattern, wkt)
+        # Números con signo (y exponente), como los que acepta el parser de MULTILINESTRING
+        number = r'([-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)'
+        pattern = (r'POINT\s*(?:(ZM|Z|M)\s*)?\(\s*' + number + r'\s+' + number +
+                   r'((?:\s+[-+.\deE]+)*)\s*\)')
+        match = re.search(pattern, wkt, re.IGNORECASE)
         if match:
-            lon = float(match.group(1))
-            lat = float(match.group(2))
+            # Tantos valores extra como declara la dimensión (ninguno, uno o dos sin declararla)
+            extra = len(match.group(4).split())
+            expected = {None: (0, 1, 2), "Z": (1,), "M": (1,), "ZM": (2,)}[
+                match.group(1) and match.group(1).upper()]
+            if extra not in expected:
+                return None
+            lon = float(match.group(2))
+            lat = float(match.group(3))
             return {"lat": lat, "lng": lon}
         return None
     except Exception as e:
@@ -31,17 +134,7 @@ def parse_multilinestring_wkt(wkt: str) -> List[Dict[str, float]]:
     Ejemplo: MULTILINESTRING ((2.168 41.373, 2.165 41.370, 2.163 41.368))
     """
     try:
-        pattern = r'([\d.]+)\s+([\d.]+)'
-        matches = re.findall(pattern, wkt)
-        
-        coordinates = []
-        for lon, lat in matches:
-            coordinates.append({
-                "lat": float(lat),
-                "lng": float(lon)
-            })
-        
-        return coordinates
+        return encode_parts(parse_multilinestring(wkt), "objects")
     except Exception as e:
         print(f"Error parseando WKT: {e}")
         return []
@@ -49,43 +142,54 @@ def parse_multilinestring_wkt(wkt: str) -> List[Dict[str, float]]:
 
 async def query_sparql(query: str, response_format: str = "application/sparql-results+json") -> Any:
     """Ejecuta una consulta SPARQL de forma asíncrona"""
+    if embedded_enabled():
+        return await get_store().query(query, response_format)
+
     headers = {"Accept": response_format}
     params = {"query": query}
     
-    async with httpx.AsyncClient(timeout=20.0) as client:
-        try:
-            resp = await client.get(SPARQL_ENDPOINT, params=params, headers=headers)
-            resp.raise_for_status()
-            
-            if "json" in resp.headers.get("content-type", ""):
-                return resp.json()
-            else:
-                return resp.text
-                
-        except httpx.ConnectError:
-            raise HTTPException(
-                status_code=502,
-                detail={
-                    "error": "No se puede conectar con Apache Jena Fuseki",
-                    "details": f"Fuseki no está corriendo en {SPARQL_ENDPOINT}",
-                    "solution": "Inicia Fuseki con: fuseki-server --update --mem /dataset"
-                }
-            )
-        except httpx.TimeoutException:
-            raise HTTPException(
-                status_code=504,
-                detail={
-                    "error": "Timeout al conectar con Fuseki",
-                    "details": "La consulta tardó demasiado tiempo",
-                    "solution": "Verifica que Fuseki esté funcionando correctamente"
-                }
-            )
-        except httpx.HTTPStatusError as e:
-            raise HTTPException(
-                status_code=502,
-                detail={
-                    "error": "Error al ejecutar la consulta SPARQL",
-                    "details": str(e),
-                    "endpoint": SPARQL_ENDPOINT
-                }
-            )
+    client = get_client()
+    _client_stats["requests"] += 1
+    _client_stats["in_flight"] += 1
+    _client_stats["peak_in_flight"] = max(_client_stats["peak_in_flight"], _client_stats["in_flight"])
+    try:
+        resp = await client.get(SPARQL_ENDPOINT, params=params, headers=headers)
+        resp.raise_for_status()
+
+        if "json" in resp.headers.get("content-type", ""):
+            return resp.json()
+        else:
+            return resp.text
+
+    except httpx.ConnectError:
+        _client_stats["errors"] += 1
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "error": "No se puede conectar con Apache Jena Fuseki",
+                "details": f"Fuseki no está corriendo en {SPARQL_ENDPOINT}",
+                "solution": "Inicia Fuseki con: fuseki-server --update --mem /dataset"
+            }
+        )
+    except httpx.TimeoutException:
+        _client_stats["errors"] += 1
+        raise HTTPException(
+            status_code=504,
+            detail={
+                "error": "Timeout al conectar con Fuseki",
+                "details": "La consulta tardó demasiado tiempo",
+                "solution": "Verifica que Fuseki esté funcionando correctamente"
+            }
+        )
+    except httpx.HTTPStatusError as e:
+        _client_stats["errors"] += 1
+        raise HTTPException(
+            status_code=502,
+            detail={
+                "error": "Error al ejecutar la consulta SPARQL",
+                "details": str(e),
+                "endpoint": SPARQL_ENDPOINT
+            }
+        )
+    finally:
+        _client_stats["in_flight"] -= 1
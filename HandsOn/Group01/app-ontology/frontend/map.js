@@ -4,6 +4,8 @@ let stationsData = [];
 let linesData = [];
 let markers = [];
 let polylines = [];
+let markersById = {};
+let polylinesByCode = {};
 let routeLayer = null;
 
 const lineColors = {
@@ -31,6 +33,7 @@ function initMap() {
   }).addTo(map);
 
   loadMapData();
+  listenForDatasetChanges();
 }
 
 async function loadMapData() {
@@ -65,6 +68,55 @@ async function loadMapData() {
   }
 }
 
+// Cambios del dataset enviados por el backend (/api/events): se actualiza solo lo que cambió
+function listenForDatasetChanges() {
+  if (!window.EventSource) return;
+  const source = new EventSource('/api/events');
+  source.addEventListener('dataset', event => {
+    applyDatasetChange(JSON.parse(event.data)).catch(error => {
+      console.error('Error aplicando cambios del dataset:', error);
+    });
+  });
+}
+
+function mergeRecords(items, delta, key) {
+  const replaced = new Set([...delta.removed, ...delta.changed]);
+  const kept = items.filter(item => !replaced.has(item[key]));
+  const updated = [...delta.added, ...delta.changed].map(id => delta.records[id]).filter(Boolean);
+  return kept.concat(updated);
+}
+
+async function applyDatasetChange(change) {
+  if (change.resync) {
+    location.reload();
+    return;
+  }
+
+  const stations = change.stations;
+  if (stations && stations.added.length + stations.changed.length + stations.removed.length > 0) {
+    stationsData = mergeRecords(stationsData, stations, 'id');
+    [...stations.removed, ...stations.changed].forEach(removeStationMarker);
+    [...stations.added, ...stations.changed].forEach(id => {
+      if (stations.records[id]) addStationMarker(stations.records[id]);
+    });
+    populateStationSelects();
+  }
+
+  const lines = change.lines;
+  if (lines && lines.added.length + lines.changed.length + lines.removed.length > 0) {
+    linesData = mergeRecords(linesData, lines, 'code');
+  }
+
+  const geometries = change.line_geometries;
+  if (geometries) {
+    geometries.removed.forEach(removeLinePolyline);
+    const codes = [...geometries.added, ...geometries.changed];
+    if (codes.length > 0) await renderLines(codes);
+  }
+
+  console.log(`🔄 Dataset actualizado a la versión ${change.version}`);
+}
+
 function formatLineCode(lineCode) {
   const numCode = parseInt(lineCode);
   if (numCode >= 1 && numCode <= 11) {
@@ -85,36 +137,56 @@ function formatLineCode(lineCode) {
 }
 
 function renderStations() {
-  stationsData.forEach(station => {
-    if (!station.latitude || !station.longitude) return;
-
-    const isInterchange = station.lines && station.lines.length > 1;
-    
-    const icon = L.divIcon({
-      className: 'station-marker' + (isInterchange ? ' interchange' : ''),
-      iconSize: isInterchange ? [16, 16] : [12, 12],
-      iconAnchor: isInterchange ? [8, 8] : [6, 6]
-    });
+  stationsData.forEach(addStationMarker);
+}
 
-    const marker = L.marker([station.latitude, station.longitude], { icon })
-      .addTo(map);
+function addStationMarker(station) {
+  if (!station.latitude || !station.longitude) return;
 
-    marker.on('click', () => showStationDetails(station));
-    markers.push(marker);
+  const isInterchange = station.lines && station.lines.length > 1;
+  
+  const icon = L.divIcon({
+    className: 'station-marker' + (isInterchange ? ' interchange' : ''),
+    iconSize: isInterchange ? [16, 16] : [12, 12],
+    iconAnchor: isInterchange ? [8, 8] : [6, 6]
   });
+
+  const marker = L.marker([station.latitude, station.longitude], { icon })
+    .addTo(map);
+
+  marker.on('click', () => showStationDetails(station));
+  markers.push(marker);
+  markersById[station.id] = marker;
+}
+
+function removeStationMarker(stationId) {
+  const marker = markersById[stationId];
+  if (!marker) return;
+  map.removeLayer(marker);
+  markers = markers.filter(m => m !== marker);
+  delete markersById[stationId];
 }
 
-async function renderLines() {
+function removeLinePolyline(lineCode) {
+  const polyline = polylinesByCode[lineCode];
+  if (!polyline) return;
+  map.removeLayer(polyline);
+  polylines = polylines.filter(p => p !== polyline);
+  delete polylinesByCode[lineCode];
+}
+
+async function renderLines(codes) {
   try {
-    const resp = await fetch('/api/line-geometries');
+    // Una lista de [lat, lng] por cada parte del MULTILINESTRING (solo de "codes" si se indica)
+    const filter = codes ? `&codes=${encodeURIComponent(codes.join(','))}` : '';
+    const resp = await fetch(`/api/line-geometries?format=parts${filter}`);
     const lineGeometries = await resp.json();
 
     lineGeometries.forEach(lineData => {
-      if (!lineData.coordinates || lineData.coordinates.length < 2) return;
+      removeLinePolyline(lineData.code);
+      if (!lineData.coordinates || lineData.coordinates.length === 0) return;
 
-      const coords = lineData.coordinates.map(coord => [coord.lat, coord.lng]);
-
-      const polyline = L.polyline(coords, {
+      const polyline = L.polyline(lineData.coordinates, {
         color: lineData.color,
         weight: 4,
         opacity: 0.7,
@@ -123,6 +195,7 @@ async function renderLines() {
 
       polyline.on('click', () => showLineDetails(lineData.code));
       polylines.push(polyline);
+      polylinesByCode[lineData.code] = polyline;
     });
     
     console.log(`✅ ${lineGeometries.length} líneas renderizadas`);
@@ -305,6 +378,11 @@ function populateStationSelects() {
   const sortedStations = Array.from(uniqueStations.values()).sort((a, b) => 
     a.name.localeCompare(b.name)
   );
+
+  // Se conserva la opción vacía y la selección actual al repoblar tras un cambio
+  const selected = [originSelect.value, destSelect.value];
+  originSelect.length = 1;
+  destSelect.length = 1;
   
   sortedStations.forEach(station => {
     const option1 = document.createElement('option');
@@ -317,6 +395,7 @@ function populateStationSelects() {
     option2.textContent = station.name;
     destSelect.appendChild(option2);
   });
+  [originSelect.value, destSelect.value] = selected;
 }
 
 function checkRouteInputs() {
@@ -1,11 +1,17 @@
+import hashlib
+
 import streamlit as st
-from rdflib import Graph
-from rdflib.plugins.sparql import prepareQuery
 import pandas as pd
-from urllib.parse import unquote
-import re
-import time
-from SPARQLWrapper import SPARQLWrapper, JSON
+
+try:
+    import pyarrow  # noqa: F401 - motor de DataFrame.to_parquet
+except ImportError:  # la descarga Parquet es opcional
+    pyarrow = None
+
+from graph_provider import GraphProvider
+from query_registry import QueryRegistry
+from wikidata import WikidataFederation, join_bindings
+from wikidata_cache import EntityCache
 
 
 
@@ -140,106 +146,43 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-#Si s parece una URI, devolver la parte local (después de / o #)
-def _shorten_uri(s):
-    if s.startswith('http://') or s.startswith('https://'):
-        parts = re.split(r'[#/]', s)
-        if parts:
-            return parts[-1]
-    return s
+@st.cache_resource
+def get_graph_provider():
+    """Proveedor del grafo compartido por todas las sesiones (se cachea el proveedor, no el resultado)"""
+    return GraphProvider()
 
 
-@st.cache_resource
 def load_graph():
-    """Carga el grafo RDF (con caché para mejor rendimiento)"""
-    g = Graph()
-    githubStorage = "https://raw.githubusercontent.com/Istrar/Curso2025-2026/refs/heads/master/HandsOn/Group02/rdf"
+    """Carga el grafo RDF: snapshot o fichero local primero; los errores no se cachean"""
     try:
-        g.parse(githubStorage + "/knowledge-graph-with-links.ttl", format="turtle")
-        return g, None
+        return get_graph_provider().get_with_version(), None
     except Exception as e:
-        return None, str(e)
+        return (None, None), str(e)
 
 
-def execute_query(g, query):
-    #Ejecuta una query SPARQL y devuelve un DataFrame
-    try:
-        res = g.query(prepareQuery(query))
-        rows = list(res)
-        if not rows:
-            return pd.DataFrame(), None
-
-        # Obtener nombres de variables
-        headers = [str(v) for v in getattr(res, 'vars', [])]
-
-        # Procesar resultados
-        data = []
-        for r in rows:
-            row_data = []
-            for x in r:
-                if x is not None:
-                    s = str(x)
-                    try:
-                        s = unquote(s)
-                    except:
-                        pass
-                    s = _shorten_uri(s)
-                    row_data.append(s)
-                else:
-                    row_data.append("")
-            data.append(row_data)
+@st.cache_resource
+def get_query_registry():
+    """Consultas de QUERIES preparadas una vez y sus resultados por versión del grafo"""
+    return QueryRegistry(QUERIES)
 
-        df = pd.DataFrame(data, columns=headers)
-        return df, None
-    except Exception as e:
-        return pd.DataFrame(), str(e)
+
+def execute_query(g, query, graph_version=None):
+    #Ejecuta una query SPARQL y devuelve un DataFrame (cacheado si se indica la versión del grafo)
+    return get_query_registry().execute(g, graph_version, query)
+
+
+@st.cache_resource
+def get_wikidata_engine():
+    """Motor de federación con Wikidata compartido: sesión HTTP, pool, limitador de ritmo y caché en disco"""
+    return WikidataFederation(cache=EntityCache())
 
 
 def execute_wikidata_query(sparql_query):
     """Ejecuta una query SPARQL en Wikidata y devuelve un DataFrame"""
-    attempts = 3
-    backoff = 1.0
-    last_err = None
-    for attempt in range(attempts):
-        try:
-            sparql = SPARQLWrapper("https://query.wikidata.org/sparql")
-            sparql.setQuery(sparql_query)
-            sparql.setReturnFormat(JSON)
-            sparql.addCustomHttpHeader(
-                "User-Agent", "BarcelonaActivitiesExplorer/1.0")
-
-            results = sparql.query().convert()
-
-            if not results.get("results", {}).get("bindings"):
-                return pd.DataFrame(), None
-            # si hay resultados
-            bindings = results["results"]["bindings"]
-            headers = list(bindings[0].keys()) if bindings else []
-
-            data = []
-            for binding in bindings:
-                row = []
-                for header in headers:
-                    value = binding.get(header, {}).get("value", "")
-                    # Acortar URIs si es necesario
-                    value = _shorten_uri(value) if value else ""
-                    row.append(value)
-                data.append(row)
-
-            df = pd.DataFrame(data, columns=headers)
-            return df, None
-        except Exception as e:
-            last_err = e
-            # Si no es el último intento, esperar con backoff y reintentar
-            if attempt < attempts - 1:
-                time.sleep(backoff)
-                backoff *= 2
-                continue
-            else:
-                return pd.DataFrame(), str(last_err)
+    return get_wikidata_engine().run_query(sparql_query)
 
 
-def execute_combined_query(g, rdf_query, wikidata_query_template, input_variable, debug=False):
+def execute_combined_query(g, rdf_query, wikidata_query_template, input_variable, debug=False, graph_version=None):
     """
     Ejecuta una query RDF, luego usa sus resultados como input para Wikidata con procesamiento por batches,
     y devuelve AMBOS DataFrames: el RDF original y el combinado RDF+Wikidata
@@ -249,6 +192,7 @@ def execute_combined_query(g, rdf_query, wikidata_query_template, input_variable
         rdf_query: Query SPARQL para el RDF local
         wikidata_query_template: Template de query Wikidata con placeholder {values}
         input_variable: Variable del resultado RDF a usar como input
+        graph_version: Versión del grafo, para reutilizar el resultado RDF ya calculado
         wikidata_input_var: Variable en la query Wikidata donde insertar los valores (debe ser 'searchTerm')
         merge_key: Tupla (col_rdf, col_wikidata) para hacer el merge. Si es None, usa searchTerm
         debug: Si es True, retorna también las queries generadas para cada batch
@@ -257,7 +201,7 @@ def execute_combined_query(g, rdf_query, wikidata_query_template, input_variable
         (df_rdf_original, df_combined, error, batch_info): DataFrame RDF original, DataFrame combinado, mensaje de error, info de batches
     """
     # Ejecutar query RDF
-    df_rdf, error = execute_query(g, rdf_query)
+    df_rdf, error = execute_query(g, rdf_query, graph_version)
     if error:
         return df_rdf if df_rdf is not None else pd.DataFrame(), None, error, None
 
@@ -273,87 +217,17 @@ def execute_combined_query(g, rdf_query, wikidata_query_template, input_variable
     if len(input_values) == 0:
         return df_rdf, df_rdf, "No hay valores únicos para consultar en Wikidata", None
 
-    # 4. PROCESAMIENTO POR BATCHES para evitar timeouts
-    batch_size = 10
-    max_values = min(len(input_values), 200)  # Limitar a 200 valores máximo
-    batches = [input_values[i:i+batch_size]
-               for i in range(0, max_values, batch_size)]
-
-    df_wikidata_list = []
-    errors = []
-    batch_queries = []  # Para almacenar las queries generadas (debug)
-
-    for idx, batch in enumerate(batches):
-        # Construir VALUES clause para este batch
-        # Si el valor parece una URI de Wikidata o un QID, usar formato wd:Q123
-        # Si no, usar como string entrecomillado
-        formatted_values = []
-        for v in batch:
-            v_str = str(v)
-            # Detectar URIs completas de Wikidata (http://www.wikidata.org/entity/Q...)
-            if 'wikidata.org/entity/' in v_str:
-                qid = v_str.split('/')[-1]
-                formatted_values.append(f'wd:{qid}')
-            # Detectar QIDs ya acortados (Q seguido de números)
-            elif re.match(r'^Q\d+$', v_str):
-                formatted_values.append(f'wd:{v_str}')
-            else:
-                # String normal, entrecomillar
-                formatted_values.append(f'"{v_str.replace("\"", "\\\"")}"')
-        
-        batch_values_clause = " ".join(formatted_values)
-        wikidata_query = wikidata_query_template.replace(
-            "{values}", batch_values_clause)
-
-        # Guardar query generada para debug
-        batch_queries.append({
-            'batch_num': idx + 1,
-            'values_count': len(batch),
-            'values': list(batch),
-            'query': wikidata_query
-        })
-
-        # Ejecutar query para este batch
-        df_batch, error_wd = execute_wikidata_query(wikidata_query)
-
-        if error_wd:
-            errors.append(error_wd)
-        elif df_batch is not None and not df_batch.empty:
-            df_wikidata_list.append(df_batch)
-
-        # Pausa cortés entre requests
-        if len(batches) > 1:
-            time.sleep(0.8)
-
-    # Concatenar resultados de todos los batches
-    if not df_wikidata_list:
+    # Lotes concurrentes con ritmo limitado y tamaño adaptativo (ver wikidata.py)
+    head_vars, bindings, errors, batch_queries = get_wikidata_engine().fetch_bindings(
+        wikidata_query_template, input_values, debug=debug)
+
+    if not bindings:
         error_msg = f"Wikidata no devolvió resultados. Errores: {'; '.join(errors)}" if errors else "Wikidata no devolvió resultados"
         return df_rdf, df_rdf, error_msg, batch_queries if debug else None
 
-    df_wikidata = pd.concat(df_wikidata_list, ignore_index=True, sort=False)
-    df_wikidata = df_wikidata.drop_duplicates()
-
-
-    # Renombrar searchTerm a la variable del RDF para hacer merge
-    df_wikidata_renamed = df_wikidata.copy()
-    df_wikidata_renamed.rename(
-        columns={'searchTerm': input_variable}, inplace=True)
-    # Añadir prefijo wd_ a todas las columnas de Wikidata excepto la de join
-    cols_to_rename = {
-        col: f'wd_{col}' for col in df_wikidata_renamed.columns if col != input_variable}
-    df_wikidata_renamed.rename(columns=cols_to_rename, inplace=True)
-    # Hacer merge usando INNER JOIN para mantener todas las filas RDF
-    df_combined = pd.merge(df_rdf, df_wikidata_renamed,
-                           on=input_variable, how='inner', suffixes=('', '_dup'))
-    df_combined = df_combined.loc[:, ~
-                                  df_combined.columns.str.endswith('_dup')]
-    
-    # Eliminar filas duplicadas que se generan cuando Wikidata devuelve múltiples resultados por entidad
-    rdf_columns = list(df_rdf.columns)
-    df_combined = df_combined.drop_duplicates(subset=rdf_columns, keep='first')
-    
-    # Reemplazar NaN/None por cadenas vacías
-    df_combined = df_combined.fillna('')
+    # Hash join por la variable de entrada: cada fila RDF distinta con la primera
+    # fila de Wikidata de su entidad (columnas con prefijo wd_)
+    df_combined = join_bindings(df_rdf, input_variable, head_vars, bindings)
     return df_rdf, df_combined, None, batch_queries if debug else None
 
 # Definir las queries (10 queries)
@@ -515,7 +389,7 @@ QUERIES = {
         ORDER BY ?nombre
         ''',
         "query_wikidata": '''
-        SELECT ?nombreComarca ?capital ?puntoMasAlto ?area ?poblacion
+        SELECT ?searchTerm ?nombreComarca ?capital ?puntoMasAlto ?area ?poblacion
         WHERE {
             VALUES ?searchTerm { {values} }
 
@@ -700,6 +574,114 @@ QUERIES = {
 }
 
 
+# Filas por página de las tablas de resultados
+PAGE_SIZES = [25, 50, 100, 250, 500]
+
+
+def result_id(*parts):
+    """Identidad de un resultado: sha1 de la consulta, la versión del grafo y la ejecución"""
+    return hashlib.sha1("\n".join(map(str, parts)).encode("utf-8")).hexdigest()
+
+
+def sort_order(df, result_key, table, column, descending):
+    """
+    Posiciones de las filas ordenadas por ``column`` (numéricamente si todos los
+    valores no vacíos son números); se calcula una vez por tabla y columna. Solo
+    se guardan los órdenes del resultado mostrado (``result_key``)
+    """
+    cache = st.session_state.get("sort_orders")
+    if cache is None or cache["result"] != result_key:
+        cache = st.session_state["sort_orders"] = {"result": result_key, "orders": {}}
+    key = (table, column, descending)
+    order = cache["orders"].get(key)
+    if order is None:
+        values = df[column].astype(str).reset_index(drop=True)
+        filled = values != ""
+        numeric = pd.to_numeric(values.where(filled), errors="coerce")
+        sort_key = numeric if numeric.notna().sum() == filled.sum() else values.where(filled)
+        order = sort_key.sort_values(ascending=not descending, kind="stable", na_position="last").index.to_numpy()
+        cache["orders"][key] = order
+    return order
+
+
+def render_paged_results(df, key, file_stem, result_key):
+    """
+    Muestra ``df`` por páginas (solo se envía al navegador la página visible),
+    con orden por columna y descargas CSV/JSON/Parquet generadas al pulsar.
+    ``result_key`` identifica el resultado mostrado (ver result_id)
+    """
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    with col1:
+        sort_column = st.selectbox("Ordenar por", ["(orden original)", *df.columns], key=f"{key}_sort")
+    with col2:
+        descending = st.toggle("Descendente", key=f"{key}_desc")
+    with col3:
+        page_size = st.selectbox("Filas por página", PAGE_SIZES, index=2, key=f"{key}_page_size")
+    pages = max(1, -(-len(df) // page_size))
+    # Un resultado nuevo o un tamaño de página mayor puede dejar la página fuera de rango
+    if st.session_state.setdefault(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    with col4:
+        page = st.number_input("Página", min_value=1, max_value=pages, step=1, key=f"{key}_page")
+
+    start = (page - 1) * page_size
+    if sort_column == "(orden original)":
+        page_df = df.iloc[start:start + page_size]
+    else:
+        page_df = df.iloc[sort_order(df, result_key, key, sort_column, descending)[start:start + page_size]]
+    st.caption(f"Filas {start + 1 if len(df) else 0}–{start + len(page_df)} de {len(df)} · página {page} de {pages}")
+
+    view_option = st.radio(
+        "",
+        ["Tabla Interactiva", "JSON", "Datos Raw"],
+        horizontal=True,
+        key=f"view_{key}"
+    )
+
+    if view_option == "Tabla Interactiva":
+        st.dataframe(
+            page_df,
+            width="stretch",
+            height=min(500, (len(page_df) + 1) * 35 + 3),
+            hide_index=True
+        )
+    elif view_option == "JSON":
+        st.json(page_df.to_dict(orient='records'))
+    else:
+        st.text(page_df.to_string())
+
+    # Descargas del resultado completo: el fichero se genera solo al pulsar el botón
+    col1, col2, col3, _ = st.columns([1, 1, 1, 1])
+    with col1:
+        st.download_button(
+            label="📥 Descargar CSV",
+            data=lambda: df.to_csv(index=False).encode('utf-8'),
+            file_name=f"{file_stem}.csv",
+            mime="text/csv",
+            width="stretch",
+            key=f"{key}_csv"
+        )
+    with col2:
+        st.download_button(
+            label="📥 Descargar JSON",
+            data=lambda: df.to_json(orient='records', indent=2),
+            file_name=f"{file_stem}.json",
+            mime="application/json",
+            width="stretch",
+            key=f"{key}_json"
+        )
+    if pyarrow is not None:
+        with col3:
+            st.download_button(
+                label="📥 Descargar Parquet",
+                data=lambda: df.to_parquet(index=False),
+                file_name=f"{file_stem}.parquet",
+                mime="application/vnd.apache.parquet",
+                width="stretch",
+                key=f"{key}_parquet"
+            )
+
+
 def main():
     # Título principal
         # Inicializar session state
@@ -713,6 +695,10 @@ def main():
         st.session_state.query_ejecutada = None
     if 'batch_info' not in st.session_state:
         st.session_state.batch_info = None
+    if 'ejecuciones' not in st.session_state:
+        st.session_state.ejecuciones = 0
+    if 'resultado_id' not in st.session_state:
+        st.session_state.resultado_id = None
     st.markdown("""
         <h1 style='text-align: center; margin-bottom: 0; font-size: 3em;'>
             Barcelona Activities Explorer
@@ -726,7 +712,7 @@ def main():
 
     # Cargar el grafo
     with st.spinner("Cargando datos del grafo RDF..."):
-        g, error = load_graph()
+        (g, graph_version), error = load_graph()
 
     if error:
         st.error(f"Error al cargar el grafo: {error}")
@@ -765,6 +751,16 @@ def main():
         # Mostrar info de la query seleccionada
         st.info(f"**{QUERIES[query_num]['nombre']}**") 
 
+        graph_stats = get_graph_provider().stats()
+        st.caption(
+            f"Grafo: {graph_stats['triples']:,} triples, cargado en "
+            f"{graph_stats['load_seconds']:.2f} s desde {graph_stats['source']}")
+        wikidata_cache = get_wikidata_engine().stats()["cache"]
+        st.caption(
+            f"Caché de Wikidata: {wikidata_cache['entries']:,} entidades "
+            f"({wikidata_cache['fresh'] + wikidata_cache['stale']:,} aciertos, "
+            f"{wikidata_cache['misses'] + wikidata_cache['expired']:,} pedidas)")
+
     # Contenido principal
     st.markdown(f"## Query {query_num}: {QUERIES[query_num]['nombre']}")
 
@@ -799,6 +795,11 @@ def main():
     # Solo ejecutar si se presiona el botón
     if ejecutar:
         st.session_state.query_ejecutada = query_num
+        # Cada ejecución es un resultado nuevo (Wikidata puede devolver otros datos)
+        st.session_state.ejecuciones += 1
+        st.session_state.resultado_id = result_id(
+            query_config.get("query") or query_config.get("query_rdf", ""),
+            query_config.get("query_wikidata", ""), graph_version, st.session_state.ejecuciones)
 
         if es_combinada:
             # Ejecutar query combinada usando la función centralizada
@@ -814,7 +815,8 @@ def main():
                 g,
                 query_config.get("query_rdf", ""),
                 query_config.get("query_wikidata", ""),
-                query_config.get("input_var", "titulo")
+                query_config.get("input_var", "titulo"),
+                graph_version=graph_version
             )
 
             progress_bar.progress(90)
@@ -849,7 +851,7 @@ def main():
         else:
             # Ejecutar query simple
             with st.spinner("Ejecutando consulta SPARQL..."):
-                df, error = execute_query(g, query_config["query"])
+                df, error = execute_query(g, query_config["query"], graph_version)
 
             if error:
                 st.error(f"Error al ejecutar la query: {error}")
@@ -901,47 +903,10 @@ def main():
 
         st.markdown("<br>", unsafe_allow_html=True)
 
-        # Opciones de visualización RDF
-        view_option = st.radio(
-            "",
-            ["Tabla Interactiva", "JSON", "Datos Raw"],
-            horizontal=True,
-            key="view_rdf"
-        )
-
-        if view_option == "Tabla Interactiva":
-            st.dataframe(
-                df,
-                width="stretch",
-                height=min(500, (len(df) + 1) * 35 + 3)
-            )
-        elif view_option == "JSON":
-            st.json(df.to_dict(orient='records'))
-        else:
-            st.text(df.to_string())
-
-        # Botones de exportación RDF
-        col1, col2, col3 = st.columns([1, 1, 2])
-
-        with col1:
-            csv = df.to_csv(index=False).encode('utf-8')
-            st.download_button(
-                label="📥   Descargar CSV",
-                data=csv,
-                file_name=f"query_{query_num}_rdf_{QUERIES[query_num]['nombre'].replace(' ', '_')}.csv",
-                mime="text/csv",
-                width="stretch"
-            )
-
-        with col2:
-            json_str = df.to_json(orient='records', indent=2)
-            st.download_button(
-                label="📥 Descargar JSON",
-                data=json_str,
-                file_name=f"query_{query_num}_rdf_{QUERIES[query_num]['nombre'].replace(' ', '_')}.json",
-                mime="application/json",
-                width="stretch"
-            )
+        # Tabla paginada y descargas RDF
+        render_paged_results(
+            df, "rdf", f"query_{query_num}_rdf_{QUERIES[query_num]['nombre'].replace(' ', '_')}",
+            st.session_state.resultado_id)
 
         # SEGUNDA TABLA: Datos Combinados (solo para queries combinadas)
         if es_combinada and st.session_state.resultados_combinados is not None:
@@ -987,48 +952,11 @@ def main():
 
             st.markdown("<br>", unsafe_allow_html=True)
 
-            # Opciones de visualización Combinados
-            view_option_combined = st.radio(
-                "",
-                ["Tabla Interactiva", "JSON", "Datos Raw"],
-                horizontal=True,
-                key="view_combined"
-            )
-
-            if view_option_combined == "Tabla Interactiva":
-                st.dataframe(
-                    df_combined,
-                    width="stretch",
-                    height=min(500, (len(df_combined) + 1) * 35 + 3)
-                )
-            elif view_option_combined == "JSON":
-                st.json(df_combined.to_dict(orient='records'))
-            else:
-                st.text(df_combined.to_string())
-
-            # Botones de exportación Combinados
-            col1, col2, col3 = st.columns([1, 1, 2])
-
-            with col1:
-                csv_combined = df_combined.to_csv(index=False).encode('utf-8')
-                st.download_button(
-                    label="📥 Descargar CSV",
-                    data=csv_combined,
-                    file_name=f"query_{query_num}_combinado_{QUERIES[query_num]['nombre'].replace(' ', '_')}.csv",
-                    mime="text/csv",
-                    width="stretch"
-                )
-
-            with col2:
-                json_str_combined = df_combined.to_json(
-                    orient='records', indent=2)
-                st.download_button(
-                    label="📥 Descargar JSON",
-                    data=json_str_combined,
-                    file_name=f"query_{query_num}_combinado_{QUERIES[query_num]['nombre'].replace(' ', '_')}.json",
-                    mime="application/json",
-                    width="stretch"
-                )
+            # Tabla paginada y descargas Combinados
+            render_paged_results(
+                df_combined, "combined",
+                f"query_{query_num}_combinado_{QUERIES[query_num]['nombre'].replace(' ', '_')}",
+                st.session_state.resultado_id)
 
 
 if __name__ == "__main__":
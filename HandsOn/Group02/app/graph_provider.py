@@ -0,0 +1,209 @@
+# graph_provider.py - Grafo RDF compartido del explorador, con snapshot local y refresco por TTL
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from rdflib import BNode, Graph, Literal, URIRef
+
+APP_DIR = Path(__file__).resolve().parent
+LOCAL_FILE = APP_DIR.parent / "rdf" / "knowledge-graph-with-links.ttl"
+REMOTE_URL = ("https://raw.githubusercontent.com/Istrar/Curso2025-2026/refs/heads/master"
+              "/HandsOn/Group02/rdf/knowledge-graph-with-links.ttl")
+
+# Configurables por entorno: carpeta de snapshots y segundos antes de recargar el grafo
+CACHE_DIR = Path(os.environ.get("GROUP02_CACHE_DIR", Path.home() / ".cache" / "group02-explorer"))
+GRAPH_TTL = float(os.environ.get("GROUP02_GRAPH_TTL", "3600"))
+
+SNAPSHOT_VERSION = 2
+
+
+def _encode_term(term):
+    if isinstance(term, URIRef):
+        return ["u", str(term)]
+    if isinstance(term, BNode):
+        return ["b", str(term)]
+    return ["l", str(term), str(term.datatype) if term.datatype else None, term.language]
+
+
+def _decode_term(term):
+    if term[0] == "u":
+        return URIRef(term[1])
+    if term[0] == "b":
+        return BNode(term[1])
+    return Literal(term[1], datatype=term[2], lang=term[3])
+
+
+class GraphProvider:
+    """
+    Grafo compartido por todas las sesiones del proceso.
+
+    Orden de carga: snapshot JSON (términos y triples del grafo ya parseado, si
+    sigue correspondiendo al origen), fichero local y, si no existe, la URL
+    remota. El snapshot son solo datos: leerlo nunca ejecuta código.
+    Pasado el TTL se sigue sirviendo el grafo actual mientras un hilo lo
+    recarga. Los errores no se guardan: el siguiente acceso vuelve a intentarlo.
+    """
+
+    def __init__(self, local_path=LOCAL_FILE, remote_url=REMOTE_URL, cache_dir=CACHE_DIR, ttl=GRAPH_TTL):
+        self.local_path = Path(local_path)
+        self.remote_url = remote_url
+        self.snapshot_path = Path(cache_dir) / "knowledge-graph.json"
+        self.ttl = ttl
+        self.graph = None
+        self.version = 0          # aumenta con cada carga correcta (clave de cachés de resultados)
+        self.source = None
+        self.signature = None
+        self.loaded_at = None
+        self.load_seconds = None
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._current = (None, 0)
+
+    def _origin(self):
+        """Origen a usar y su firma (tamaño y fecha del fichero local, o la URL)"""
+        if self.local_path.exists():
+            stat = self.local_path.stat()
+            return str(self.local_path), (stat.st_size, stat.st_mtime_ns)
+        return self.remote_url, None
+
+    def _read_snapshot(self, origin, signature):
+        try:
+            with open(self.snapshot_path, encoding="utf-8") as f:
+                snapshot = json.load(f)
+            header = snapshot["header"]
+            # JSON no distingue tuplas de listas: la firma se guarda como lista
+            if (header.get("version") != SNAPSHOT_VERSION or header.get("origin") != origin
+                    or header.get("signature") != (list(signature) if signature else None)):
+                return None, None
+            terms = [_decode_term(term) for term in snapshot["terms"]]
+            ids = snapshot["triples"]
+            graph = Graph()
+            for prefix, namespace in snapshot["namespaces"]:
+                graph.bind(prefix, namespace, override=True, replace=True)
+            graph.addN((terms[ids[i]], terms[ids[i + 1]], terms[ids[i + 2]], graph)
+                       for i in range(0, len(ids), 3))
+            return graph, header
+        except (OSError, ValueError, KeyError, IndexError, TypeError):
+            return None, None
+
+    def _write_snapshot(self, graph, origin, signature):
+        header = {"version": SNAPSHOT_VERSION, "origin": origin, "signature": signature,
+                  "created_at": time.time()}
+        # Cada término distinto se guarda una vez; los triples son índices a esa lista
+        ids, terms, triples = {}, [], []
+        for triple in graph:
+            for term in triple:
+                term_id = ids.get(term)
+                if term_id is None:
+                    term_id = ids[term] = len(terms)
+                    terms.append(_encode_term(term))
+                triples.append(term_id)
+        snapshot = {"header": header, "namespaces": [[p, str(n)] for p, n in graph.namespaces()],
+                    "terms": terms, "triples": triples}
+        tmp = None
+        try:
+            self.snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+            # Fichero temporal propio: otro proceso de Streamlit puede estar escribiendo el suyo
+            with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=self.snapshot_path.parent,
+                                             prefix=self.snapshot_path.name + ".", suffix=".tmp",
+                                             delete=False) as f:
+                tmp = f.name
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp, self.snapshot_path)
+        except OSError as e:
+            print(f"No se pudo guardar el snapshot del grafo: {e}")
+            if tmp is not None and os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _load(self, use_snapshot=True):
+        """Devuelve (grafo, origen, firma, antigüedad del snapshot o None si se acaba de parsear)"""
+        origin, signature = self._origin()
+        if use_snapshot:
+            graph, header = self._read_snapshot(origin, signature)
+            if graph is not None:
+                return graph, f"snapshot ({origin})", signature, time.time() - header["created_at"]
+        graph = Graph()
+        graph.parse(origin, format="turtle")
+        self._write_snapshot(graph, origin, signature)
+        return graph, origin, signature, None
+
+    def _set(self, graph, source, signature, start):
+        self.graph = graph
+        self.source = source
+        self.signature = signature
+        self.version += 1
+        self._current = (graph, self.version)
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start
+        self.last_error = None
+
+    def is_stale(self):
+        return self.ttl > 0 and self.loaded_at is not None and time.time() - self.loaded_at > self.ttl
+
+    def get(self):
+        return self.get_with_version()[0]
+
+    def get_with_version(self):
+        """(grafo, versión) actuales; carga el grafo si no hay ninguno y lanza la recarga si ha caducado"""
+        if self.graph is None:
+            with self._lock:
+                if self.graph is None:
+                    start = time.perf_counter()
+                    try:
+                        graph, source, signature, snapshot_age = self._load()
+                    except Exception as e:
+                        self.last_error = str(e)
+                        raise
+                    self._set(graph, source, signature, start)
+                    # Un snapshot de la URL remota más viejo que el TTL se renueva en segundo plano
+                    if snapshot_age is not None and self.ttl > 0 and snapshot_age > self.ttl:
+                        self.loaded_at -= snapshot_age
+        if self.is_stale():
+            self.refresh(background=True)
+        return self._current
+
+    def refresh(self, background=False):
+        """Recarga el grafo desde el origen (solo si el fichero local ha cambiado)"""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        if background:
+            threading.Thread(target=self._refresh, daemon=True, name="graph-refresh").start()
+        else:
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            start = time.perf_counter()
+            _, signature = self._origin()
+            if signature is not None and signature == self.signature:
+                # El fichero local no ha cambiado: se conserva el grafo cargado
+                self.loaded_at = time.time()
+                return
+            # La URL remota siempre se descarga de nuevo; un fichero local cambiado se parsea
+            graph, source, signature, _ = self._load(use_snapshot=False)
+            self._set(graph, source, signature, start)
+        except Exception as e:
+            # Se sigue sirviendo el grafo anterior; se reintentará tras otro TTL
+            self.last_error = str(e)
+            self.loaded_at = time.time()
+            print(f"No se pudo recargar el grafo: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def stats(self):
+        return {
+            "triples": len(self.graph) if self.graph is not None else 0,
+            "source": self.source,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "loaded_at": self.loaded_at,
+            "version": self.version,
+            "ttl_seconds": self.ttl,
+            "last_error": self.last_error,
+        }
@@ -0,0 +1,111 @@
+# query_registry.py - Consultas del explorador preparadas una vez y resultados cacheados por versión del grafo
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import unquote
+
+import pandas as pd
+from rdflib.plugins.sparql import prepareQuery
+
+# Campos de QUERIES que contienen SPARQL para el grafo local
+QUERY_FIELDS = ("query", "query_rdf")
+
+# Todo hasta el último / o # de una URI http(s): se muestra solo la parte local
+URI_PREFIX = r"^https?://.*[#/]"
+
+
+def shorten_column(column, decode=True):
+    """
+    Decodifica (si ``decode``) y acorta las URIs de una columna a su parte
+    local: se transforma cada valor distinto una sola vez y se reconstruye
+    la columna
+    """
+    codes, uniques = pd.factorize(column)
+    values = pd.Series(uniques)
+    if values.empty:
+        return column
+    if decode:
+        encoded = values.str.contains("%", regex=False)
+        if encoded.any():
+            values[encoded] = values[encoded].map(unquote)
+    values = values.str.replace(URI_PREFIX, "", regex=True)
+    return pd.Series(values.to_numpy()[codes], index=column.index, name=column.name)
+
+
+def result_to_dataframe(result):
+    """DataFrame con las variables de la consulta como columnas y las URIs acortadas"""
+    rows = list(result)
+    if not rows:
+        return pd.DataFrame()
+    headers = [str(v) for v in getattr(result, "vars", [])]
+    columns = zip(*rows)
+    return pd.DataFrame({
+        header: shorten_column(pd.Series([str(x) if x is not None else "" for x in values]))
+        for header, values in zip(headers, columns)
+    })
+
+
+class QueryRegistry:
+    """
+    Prepara (parseo y álgebra) cada consulta de QUERIES una sola vez y guarda
+    los DataFrames resultantes por (id de consulta, versión del grafo). Las
+    consultas que no están en el registro se preparan al vuelo y no se cachean.
+    """
+
+    def __init__(self, queries, max_results=64):
+        self.max_results = max_results
+        self.prepared = {}
+        self.errors = {}
+        self.ids = {}
+        self.results = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        for num, config in queries.items():
+            for field in QUERY_FIELDS:
+                if field not in config:
+                    continue
+                query_id = (num, field)
+                self.ids[config[field]] = query_id
+                try:
+                    self.prepared[query_id] = prepareQuery(config[field])
+                except Exception as e:
+                    self.errors[query_id] = str(e)
+
+    def execute(self, g, version, query):
+        """Ejecuta una consulta y devuelve (DataFrame, error) como execute_query"""
+        query_id = self.ids.get(query)
+        if query_id is None:
+            try:
+                return result_to_dataframe(g.query(prepareQuery(query))), None
+            except Exception as e:
+                return pd.DataFrame(), str(e)
+        if query_id in self.errors:
+            return pd.DataFrame(), self.errors[query_id]
+
+        key = (query_id, version)
+        with self._lock:
+            df = self.results.get(key)
+            if df is not None:
+                self.results.move_to_end(key)
+                self.hits += 1
+                return df.copy(), None
+        try:
+            df = result_to_dataframe(g.query(self.prepared[query_id]))
+        except Exception as e:
+            return pd.DataFrame(), str(e)
+        with self._lock:
+            self.misses += 1
+            self.results[key] = df
+            while len(self.results) > self.max_results:
+                self.results.popitem(last=False)
+        return df.copy(), None
+
+    def stats(self):
+        return {
+            "prepared": len(self.prepared),
+            "errors": len(self.errors),
+            "cached_results": len(self.results),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
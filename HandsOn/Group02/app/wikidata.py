@@ -0,0 +1,395 @@
+# wikidata.py - Federación con Wikidata: lotes concurrentes, limitados en ritmo y de tamaño adaptativo
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+
+from query_registry import URI_PREFIX, shorten_column
+from wikidata_cache import EXPIRED, STALE, template_key
+
+WIKIDATA_ENDPOINT = os.environ.get("WIKIDATA_ENDPOINT", "https://query.wikidata.org/sparql")
+USER_AGENT = "BarcelonaActivitiesExplorer/1.0"
+
+# Wikidata admite 5 consultas simultáneas por IP y 60 s de cómputo por minuto
+MAX_WORKERS = int(os.environ.get("WIKIDATA_MAX_WORKERS", "4"))
+REQUESTS_PER_SECOND = float(os.environ.get("WIKIDATA_RATE", "5"))
+REQUEST_TIMEOUT = float(os.environ.get("WIKIDATA_TIMEOUT", "60"))
+# Segundos sin pedir nada a Wikidata tras agotar los reintentos por falta de conexión
+UNREACHABLE_BACKOFF = 60.0
+
+_URI_PREFIX_RE = re.compile(URI_PREFIX)
+
+
+def format_value(value):
+    """Valor para un VALUES de Wikidata: wd:Q123 para entidades, literal entrecomillado si no"""
+    v_str = str(value)
+    # URIs completas de Wikidata (http://www.wikidata.org/entity/Q...)
+    if 'wikidata.org/entity/' in v_str:
+        return f'wd:{v_str.split("/")[-1]}'
+    # QIDs ya acortados (Q seguido de números)
+    if re.match(r'^Q\d+$', v_str):
+        return f'wd:{v_str}'
+    escaped = v_str.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def bindings_to_dataframe(data):
+    """DataFrame con las variables de la respuesta JSON (URIs acortadas, "" si no hay valor)"""
+    bindings = data.get("results", {}).get("bindings", [])
+    if not bindings:
+        return pd.DataFrame()
+    headers = data.get("head", {}).get("vars") or list(bindings[0].keys())
+    return pd.DataFrame({
+        header: shorten_column(pd.Series([b.get(header, {}).get("value", "") for b in bindings]), decode=False)
+        for header in headers
+    })
+
+
+def _category_or_values(values):
+    """Categórica (categorías ordenadas) si los valores se repiten mucho; si no, tal cual"""
+    codes, uniques = pd.factorize(values, sort=True)
+    if len(uniques) * 2 <= len(values):
+        return pd.Categorical.from_codes(codes, uniques)
+    return values
+
+
+def join_bindings(df_rdf, key_column, head_vars, bindings, key_var="searchTerm", prefix="wd_"):
+    """
+    Hash join de las filas RDF con los bindings de Wikidata por ``key_column``
+    (URIs acortadas en ambos lados). Cada fila RDF distinta con coincidencia
+    recibe las variables de la primera fila de Wikidata de su entidad, con el
+    prefijo ``prefix``; el resto de filas de esa entidad se descartan al leerlas.
+    El DataFrame final se construye una sola vez, con columnas categóricas
+    para los valores repetidos.
+    """
+    short = {}
+
+    def shorten(value):
+        result = short.get(value)
+        if result is None:
+            result = short[value] = _URI_PREFIX_RE.sub("", value)
+        return result
+
+    # Índice clave -> primer binding de la entidad
+    index = {}
+    for binding in bindings:
+        term = binding.get(key_var)
+        if term is not None:
+            index.setdefault(shorten(term["value"]), binding)
+
+    rows = df_rdf[df_rdf[key_column].isin(index.keys()) & ~df_rdf.duplicated()]
+    matched = [index[key] for key in rows[key_column]]
+    columns = {column: rows[column].to_numpy() for column in df_rdf.columns}
+    for var in head_vars:
+        name = f"{prefix}{var}"
+        if var != key_var and name not in columns:
+            columns[name] = np.array([shorten(b[var]["value"]) if var in b else "" for b in matched],
+                                     dtype=object)
+    return pd.DataFrame({name: _category_or_values(values) for name, values in columns.items()})
+
+
+class TokenBucket:
+    """Limitador de ritmo compartido: ``rate`` peticiones por segundo con ráfagas de ``capacity``"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        """Detiene todas las peticiones (p. ej. tras un 429 con Retry-After)"""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveBatchSize:
+    """
+    Tamaño de lote según la latencia observada: crece mientras las respuestas
+    llegan rápido y se reduce a la mitad con timeouts o errores del servidor
+    """
+
+    def __init__(self, initial=20, minimum=1, maximum=200, target_seconds=8.0):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            if not ok:
+                self.size = max(self.minimum, self.size // 2)
+            elif seconds < self.target_seconds / 2:
+                self.size = min(self.maximum, self.size + max(1, self.size // 2))
+            elif seconds > self.target_seconds:
+                self.size = max(self.minimum, int(self.size * 0.7))
+            return self.size
+
+
+class WikidataFederation:
+    """
+    Ejecuta consultas contra Wikidata con una sesión HTTP persistente, un pool
+    acotado de peticiones simultáneas (compartido por todas las sesiones de
+    Streamlit) y un token bucket. Los lotes que fallan por timeout se dividen
+    y se reintentan; los 429 pausan el bucket el tiempo de Retry-After.
+    """
+
+    def __init__(self, endpoint=WIKIDATA_ENDPOINT, max_workers=MAX_WORKERS,
+                 rate=REQUESTS_PER_SECOND, timeout=REQUEST_TIMEOUT, max_attempts=3, cache=None):
+        self.endpoint = endpoint
+        self.cache = cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.bucket = TokenBucket(rate, capacity=max_workers)
+        self.batch_size = AdaptiveBatchSize()
+        self.session = requests.Session()
+        self.session.headers.update({
+            "User-Agent": USER_AGENT,
+            "Accept": "application/sparql-results+json",
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="wikidata")
+        self.counters = {"requests": 0, "errors": 0, "rate_limited": 0, "timeouts": 0, "seconds": 0.0}
+        self._counters_lock = threading.Lock()
+        self.unreachable_until = 0.0
+        self._revalidating = set()
+        self._revalidating_lock = threading.Lock()
+
+    def _request(self, query):
+        """Una petición POST; devuelve un dict con el resultado y nunca lanza excepciones"""
+        outcome = {"status": None, "data": None, "error": None, "retry_after": None, "seconds": 0.0}
+        wait_seconds = self.unreachable_until - time.monotonic()
+        if wait_seconds > 0:
+            outcome["status"] = "unreachable"
+            outcome["error"] = f"Wikidata no responde (nuevo intento en {wait_seconds:.0f} s)"
+            return outcome
+        self.bucket.acquire()
+        start = time.perf_counter()
+        try:
+            resp = self.session.post(self.endpoint, data={"query": query}, timeout=(10, self.timeout))
+            outcome["status"] = resp.status_code
+            if resp.status_code == 200:
+                outcome["data"] = resp.json()
+            else:
+                outcome["error"] = f"HTTP {resp.status_code}: {resp.text[:200]}"
+                retry_after = resp.headers.get("Retry-After", "")
+                if retry_after.isdigit():
+                    outcome["retry_after"] = float(retry_after)
+        except requests.Timeout as e:
+            outcome["status"] = "timeout"
+            outcome["error"] = f"Timeout: {e}"
+        except (requests.RequestException, ValueError) as e:
+            outcome["error"] = str(e)
+        outcome["seconds"] = time.perf_counter() - start
+
+        with self._counters_lock:
+            self.counters["requests"] += 1
+            self.counters["seconds"] += outcome["seconds"]
+            if outcome["status"] == 429:
+                self.counters["rate_limited"] += 1
+            elif outcome["status"] == "timeout":
+                self.counters["timeouts"] += 1
+            if outcome["error"]:
+                self.counters["errors"] += 1
+        return outcome
+
+    def run_query(self, query):
+        """Una consulta suelta (con reintentos); devuelve (DataFrame, error)"""
+        outcome = None
+        for attempt in range(self.max_attempts):
+            outcome = self._request(query)
+            if outcome["data"] is not None:
+                return bindings_to_dataframe(outcome["data"]), None
+            if not self._retryable(outcome):
+                break
+            self.bucket.pause(outcome["retry_after"] or 2 ** attempt)
+        return pd.DataFrame(), outcome["error"]
+
+    @staticmethod
+    def _retryable(outcome):
+        status = outcome["status"]
+        return status is None or status in ("timeout", 429) or (isinstance(status, int) and status >= 500)
+
+    @staticmethod
+    def _overloaded(outcome):
+        """Timeout o error del servidor: el lote puede ser demasiado costoso"""
+        status = outcome["status"]
+        return status == "timeout" or (isinstance(status, int) and status >= 500)
+
+    def run_batches(self, template, values, debug=False):
+        """Como fetch_bindings, pero devuelve (DataFrame, errores, info de lotes o None)"""
+        head_vars, bindings, errors, batch_info = self.fetch_bindings(template, values, debug)
+        df = bindings_to_dataframe({"head": {"vars": head_vars}, "results": {"bindings": bindings}})
+        return df, errors, batch_info
+
+    def fetch_bindings(self, template, values, debug=False):
+        """
+        Ejecuta ``template`` (con el marcador {values}) para todos los valores,
+        en lotes concurrentes. Con caché solo se piden a Wikidata los valores
+        que faltan o han caducado; los que están en la ventana de revalidación
+        se sirven desde la caché y se refrescan en segundo plano.
+        Devuelve (variables, bindings JSON, errores, info de lotes o None)
+        """
+        # Un mismo valor puede llegar como URI completa y como QID: se deduplica ya formateado
+        values = list(dict.fromkeys(format_value(v) for v in values))
+        cached = self.cache.get_many(template, values) if self.cache is not None else {}
+        to_fetch = [v for v in values if v not in cached or cached[v][0] == EXPIRED]
+        stale = [v for v, (state, _, _) in cached.items() if state == STALE]
+
+        head_vars, fetched, bindings, errors, batch_info = self._fetch(template, to_fetch, debug)
+        if self.cache is not None:
+            self.cache.put_many(template, head_vars, fetched)
+            if stale:
+                self._revalidate(template, stale)
+
+        # Filas recién pedidas o, si no las hay (caché válida o Wikidata sin respuesta), las guardadas
+        for value in values:
+            if value in fetched:
+                bindings.extend(fetched[value])
+            elif value in cached:
+                _, cached_vars, cached_bindings = cached[value]
+                head_vars.extend(v for v in cached_vars if v not in head_vars)
+                bindings.extend(cached_bindings)
+        return head_vars, bindings, errors, batch_info if debug else None
+
+    def _fetch(self, template, values, debug=False):
+        """
+        Pide los valores a Wikidata en lotes concurrentes. Devuelve (variables,
+        {valor: bindings} de los lotes correctos, bindings sin valor reconocible,
+        errores, info de lotes)
+        """
+        head_vars, fetched, unmatched, errors, batch_info = [], {}, [], [], []
+        retry = deque()
+        inflight = {}
+        position = 0
+
+        while position < len(values) or retry or inflight:
+            while len(inflight) < self.max_workers and (retry or position < len(values)):
+                if retry:
+                    batch, attempt = retry.popleft()
+                else:
+                    batch = values[position:position + self.batch_size.size]
+                    position += len(batch)
+                    attempt = 0
+                query = template.replace("{values}", " ".join(batch))
+                inflight[self._pool.submit(self._request, query)] = (batch, attempt, query)
+
+            done, _ = wait(inflight, return_when=FIRST_COMPLETED)
+            for future in done:
+                batch, attempt, query = inflight.pop(future)
+                outcome = future.result()
+                if debug:
+                    batch_info.append({
+                        'batch_num': len(batch_info) + 1,
+                        'values_count': len(batch),
+                        'values': batch,
+                        'query': query,
+                        'attempt': attempt + 1,
+                        'status': outcome["status"],
+                        'seconds': round(outcome["seconds"], 3),
+                    })
+
+                if outcome["data"] is not None:
+                    self.batch_size.record(outcome["seconds"], ok=True)
+                    data = outcome["data"]
+                    head_vars.extend(v for v in data.get("head", {}).get("vars", []) if v not in head_vars)
+                    rows = {value: [] for value in batch}
+                    # Las filas se reparten por el ?searchTerm que devuelve Wikidata
+                    for binding in data.get("results", {}).get("bindings", []):
+                        term = binding.get("searchTerm")
+                        key = format_value(term["value"]) if term else None
+                        if key in rows:
+                            rows[key].append(binding)
+                        else:
+                            unmatched.append(binding)
+                    fetched.update(rows)
+                    continue
+
+                if outcome["status"] == 429:
+                    self.bucket.pause(outcome["retry_after"] or 2 ** attempt)
+                elif outcome["status"] is None:
+                    # Error de conexión: se espera antes de reintentar, igual que con un 429
+                    self.bucket.pause(2 ** attempt)
+                elif self._overloaded(outcome):
+                    self.batch_size.record(outcome["seconds"], ok=False)
+
+                if not self._retryable(outcome):
+                    errors.append(outcome["error"])
+                elif attempt + 1 >= self.max_attempts:
+                    errors.append(outcome["error"])
+                    if outcome["status"] is None:
+                        # Sin conexión: no se insiste durante un rato (se sirve la caché)
+                        self.unreachable_until = time.monotonic() + UNREACHABLE_BACKOFF
+                elif self._overloaded(outcome) and len(batch) > 1:
+                    # Lote demasiado grande para el servidor: se reintenta en dos mitades.
+                    # Dividir gasta un intento, así que un lote cuesta como mucho
+                    # 2 ** max_attempts - 1 peticiones aunque el servidor nunca responda
+                    half = len(batch) // 2
+                    retry.append((batch[:half], attempt + 1))
+                    retry.append((batch[half:], attempt + 1))
+                else:
+                    retry.append((batch, attempt + 1))
+
+        return head_vars, fetched, unmatched, errors, batch_info
+
+    def _revalidate(self, template, values):
+        """Refresca en segundo plano entradas servidas desde la caché fuera de su TTL"""
+        key = template_key(template)
+        with self._revalidating_lock:
+            values = [v for v in values if (key, v) not in self._revalidating]
+            self._revalidating.update((key, v) for v in values)
+        if not values:
+            return
+
+        def task():
+            try:
+                head_vars, fetched, _, _, _ = self._fetch(template, values)
+                self.cache.put_many(template, head_vars, fetched)
+            except Exception as e:
+                print(f"No se pudo revalidar la caché de Wikidata: {e}")
+            finally:
+                with self._revalidating_lock:
+                    self._revalidating.difference_update((key, v) for v in values)
+
+        threading.Thread(target=task, daemon=True, name="wikidata-revalidate").start()
+
+    def stats(self):
+        # Copia bajo el mismo lock con el que los hilos los actualizan
+        with self._counters_lock:
+            counters = dict(self.counters)
+        requests_made = counters["requests"]
+        return {
+            **{k: v for k, v in counters.items() if k != "seconds"},
+            "mean_seconds": round(counters["seconds"] / requests_made, 3) if requests_made else None,
+            "batch_size": self.batch_size.size,
+            "max_workers": self.max_workers,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
@@ -0,0 +1,112 @@
+# wikidata_cache.py - Caché persistente (SQLite) de las respuestas de Wikidata por entidad
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from graph_provider import CACHE_DIR
+
+# Segundos que una entrada se considera fresca y ventana posterior en la que se sirve
+# mientras se revalida en segundo plano. Las entidades sin resultados caducan antes.
+CACHE_TTL = float(os.environ.get("WIKIDATA_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_EMPTY_TTL = float(os.environ.get("WIKIDATA_CACHE_EMPTY_TTL", str(24 * 3600)))
+CACHE_STALE = float(os.environ.get("WIKIDATA_CACHE_STALE", str(30 * 24 * 3600)))
+
+FRESH, STALE, EXPIRED = "fresh", "stale", "expired"
+
+
+def template_key(template):
+    """Huella de una plantilla sin comentarios de línea ni diferencias de espaciado"""
+    lines = [line for line in template.splitlines() if not line.strip().startswith("#")]
+    normalized = " ".join(" ".join(lines).split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class EntityCache:
+    """
+    Filas de Wikidata por (plantilla normalizada, valor del VALUES), con la
+    caducidad guardada en cada entrada. Las entradas caducadas no se borran:
+    se usan como respaldo si Wikidata no responde.
+    """
+
+    def __init__(self, path=None, ttl=CACHE_TTL, empty_ttl=CACHE_EMPTY_TTL, stale=CACHE_STALE):
+        self.path = str(path or CACHE_DIR / "wikidata.sqlite")
+        self.ttl = ttl
+        self.empty_ttl = empty_ttl
+        self.stale = stale
+        self.counters = {FRESH: 0, STALE: 0, EXPIRED: 0, "misses": 0, "writes": 0}
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._conn:
+            if self.path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entities (
+                    template TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    vars TEXT NOT NULL,
+                    bindings TEXT NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    PRIMARY KEY (template, value)
+                )""")
+
+    def get_many(self, template, values):
+        """
+        {valor: (estado, vars, bindings)} de los valores presentes en la caché;
+        el estado es FRESH, STALE (servir y revalidar) o EXPIRED (volver a pedir)
+        """
+        key = template_key(template)
+        found = {}
+        now = time.time()
+        values = list(values)
+        with self._lock:
+            # SQLite limita el número de parámetros por sentencia
+            for start in range(0, len(values), 500):
+                chunk = values[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT value, vars, bindings, expires_at FROM entities "
+                    f"WHERE template = ? AND value IN ({','.join('?' * len(chunk))})",
+                    [key, *chunk]).fetchall()
+                for value, vars_json, bindings_json, expires_at in rows:
+                    if now < expires_at:
+                        state = FRESH
+                    elif now < expires_at + self.stale:
+                        state = STALE
+                    else:
+                        state = EXPIRED
+                    found[value] = (state, json.loads(vars_json), json.loads(bindings_json))
+            for state, _, _ in found.values():
+                self.counters[state] += 1
+            self.counters["misses"] += len(values) - len(found)
+        return found
+
+    def put_many(self, template, head_vars, bindings_by_value):
+        """Guarda las filas devueltas para cada valor (lista vacía si Wikidata no tenía datos)"""
+        if not bindings_by_value:
+            return
+        key = template_key(template)
+        now = time.time()
+        vars_json = json.dumps(head_vars)
+        rows = [
+            (key, value, vars_json, json.dumps(bindings), now,
+             now + (self.ttl if bindings else self.empty_ttl))
+            for value, bindings in bindings_by_value.items()
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?, ?, ?)", rows)
+            self.counters["writes"] += len(rows)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM entities")
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entities").fetchone()[0]
+            return {"entries": entries, "path": self.path, **self.counters}
@@ -1,9 +1,10 @@
-from flask import Flask, render_template, request, jsonify
-from rdflib import Graph
+from flask import Flask, Response, render_template, request, jsonify
+
+from query_service import QueryError, QueryService
 
 app = Flask(__name__)
-g = Graph()
-g.parse("rdf/res.ttl", format="turtle")
+# El grafo se carga una sola vez (en el arranque o en la primera consulta) y se comparte entre hilos
+service = QueryService("rdf/res.ttl")
 
 @app.route('/')
 def home():
@@ -11,20 +12,24 @@ def home():
 
 @app.route('/query', methods=['POST'])
 def run_sparql_query():
-    query_text = request.json.get('query')
-    
+    body = request.get_json(silent=True) or {}
+    query_text = body.get('query')
+
     if not query_text:
         return jsonify({'error': 'No se ha proporcionado consulta'}), 400
-    
+
     try:
-        results = g.query(query_text)
-        processed_results = []
-        for row in results:
-            processed_results.append(row.asdict())
-            
-        return jsonify({'results': processed_results})
+        results = service.query(query_text, max_rows=body.get('limit'))
+        return Response(results, mimetype='application/sparql-results+json')
+    except QueryError as e:
+        return jsonify({'error': str(e)}), e.status
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/stats')
+def stats():
+    return jsonify(service.stats)
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    service.load()  # carga el grafo antes de aceptar peticiones
+    app.run(debug=True, port=5000, threaded=True)
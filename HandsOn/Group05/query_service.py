@@ -0,0 +1,204 @@
+"""Servicio de consultas SPARQL sobre el grafo compartido (solo lectura).
+
+El grafo se carga una vez y se comparte entre hilos: nadie escribe en él
+después de la carga, así que las consultas pueden leer en paralelo. Cada
+consulta corre en un pool acotado con plazo y límite de filas, y el resultado
+se escribe directamente en el formato SPARQL 1.1 Query Results JSON.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import lru_cache
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.namespace import XSD
+from rdflib.plugins.sparql import prepareQuery
+from rdflib.plugins.sparql.evaluate import evalQuery
+
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", "4"))
+QUERY_TIMEOUT = float(os.environ.get("QUERY_TIMEOUT", "10"))
+QUERY_MAX_ROWS = int(os.environ.get("QUERY_MAX_ROWS", "10000"))
+# Consultas que pueden esperar turno además de las que se están ejecutando
+QUERY_QUEUE = int(os.environ.get("QUERY_QUEUE", str(QUERY_WORKERS * 2)))
+
+# Cada cuántos triples leídos se comprueba el plazo de la consulta
+DEADLINE_CHECK_EVERY = 1024
+
+_local = threading.local()
+
+
+class QueryError(Exception):
+    """Error de la consulta con el código HTTP que le corresponde"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class QueryTimeout(QueryError):
+    def __init__(self, seconds):
+        super().__init__(f"La consulta superó el tiempo máximo de {seconds:g} s", 504)
+
+
+def _check_deadline():
+    deadline = getattr(_local, "deadline", None)
+    if deadline is not None and time.monotonic() > deadline:
+        raise QueryTimeout(_local.timeout)
+
+
+class QueryGraph(Graph):
+    """
+    Grafo en memoria que comprueba el plazo de la consulta del hilo actual
+    mientras se recorren sus triples, para cortar también las fases que no
+    producen filas (ORDER BY, GROUP BY, joins grandes)
+    """
+
+    def triples(self, triple):
+        if getattr(_local, "deadline", None) is None:
+            yield from super().triples(triple)
+            return
+        _check_deadline()
+        for count, t in enumerate(super().triples(triple), 1):
+            if count % DEADLINE_CHECK_EVERY == 0:
+                _check_deadline()
+            yield t
+
+
+@lru_cache(maxsize=128)
+def _prepare(query_text):
+    try:
+        query = prepareQuery(query_text)
+    except Exception as e:
+        raise QueryError(f"Consulta no válida: {e}")
+    if _uses_service(query.algebra):
+        # SERVICE haría que el servidor lanzara peticiones HTTP a cualquier URL
+        raise QueryError("No se admiten consultas federadas (SERVICE)")
+    return query
+
+
+def _uses_service(node):
+    if getattr(node, "name", None) == "ServiceGraphPattern":
+        return True
+    if isinstance(node, dict):
+        return any(_uses_service(v) for v in node.values())
+    if isinstance(node, (list, tuple)):
+        return any(_uses_service(v) for v in node)
+    return False
+
+
+def _term_json(term):
+    """Un término RDF en el formato de SPARQL JSON, ya serializado"""
+    if isinstance(term, URIRef):
+        return '{"type":"uri","value":%s}' % json.dumps(str(term), ensure_ascii=False)
+    if isinstance(term, BNode):
+        return '{"type":"bnode","value":%s}' % json.dumps(str(term), ensure_ascii=False)
+    if isinstance(term, Literal):
+        value = json.dumps(str(term), ensure_ascii=False)
+        if term.language:
+            return '{"type":"literal","value":%s,"xml:lang":%s}' % (value, json.dumps(term.language))
+        if term.datatype is not None and term.datatype != XSD.string:
+            return '{"type":"literal","value":%s,"datatype":%s}' % (value, json.dumps(str(term.datatype)))
+        return '{"type":"literal","value":%s}' % value
+    return '{"type":"literal","value":%s}' % json.dumps(str(term), ensure_ascii=False)
+
+
+class QueryService:
+    def __init__(self, path, workers=QUERY_WORKERS, timeout=QUERY_TIMEOUT, max_rows=QUERY_MAX_ROWS,
+                 queue=QUERY_QUEUE):
+        self.path = path
+        self.timeout = timeout
+        self.max_rows = max_rows
+        self._graph = None
+        self._load_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="sparql")
+        # Plazas de ejecución + espera; si no quedan, se rechaza en vez de encolar sin fin
+        self._slots = threading.BoundedSemaphore(workers + queue)
+        self.stats = {"queries": 0, "timeouts": 0, "rejected": 0, "truncated": 0}
+
+    @property
+    def graph(self):
+        if self._graph is None:
+            self.load()
+        return self._graph
+
+    def load(self):
+        """Parsea el fichero RDF una sola vez aunque lleguen varias consultas a la vez"""
+        with self._load_lock:
+            if self._graph is None:
+                graph = QueryGraph()
+                graph.parse(self.path, format="turtle")
+                self._graph = graph
+
+    def query(self, query_text, max_rows=None):
+        """Ejecuta la consulta en el pool y devuelve el resultado en SPARQL JSON (str)"""
+        if max_rows is None:
+            max_rows = self.max_rows
+        else:
+            try:
+                max_rows = int(max_rows)
+            except (TypeError, ValueError):
+                raise QueryError("El límite de filas debe ser un número entero")
+            if max_rows < 1:
+                raise QueryError("El límite de filas debe ser mayor que 0")
+            max_rows = min(max_rows, self.max_rows)
+        query = _prepare(query_text)
+        graph = self.graph
+        if not self._slots.acquire(blocking=False):
+            self.stats["rejected"] += 1
+            raise QueryError("Servidor ocupado, inténtalo de nuevo en unos segundos", 503)
+        try:
+            future = self._pool.submit(self._run, graph, query, max_rows, time.monotonic() + self.timeout)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self.stats["queries"] += 1
+        try:
+            # Margen para que el propio hilo detecte el plazo y libere su plaza
+            return future.result(timeout=self.timeout + 1)
+        except (QueryTimeout, FutureTimeout):
+            self.stats["timeouts"] += 1
+            raise QueryTimeout(self.timeout)
+
+    def _run(self, graph, query, max_rows, deadline):
+        _local.deadline, _local.timeout = deadline, self.timeout
+        try:
+            result = evalQuery(graph, query)
+            if result["type_"] == "ASK":
+                return '{"head":{},"boolean":%s}' % ("true" if result["askAnswer"] else "false")
+            if result["type_"] != "SELECT":
+                raise QueryError("Solo se admiten consultas SELECT y ASK")
+            return self._serialize_select(result, max_rows)
+        finally:
+            _local.deadline = None
+
+    def _serialize_select(self, result, max_rows):
+        variables = [str(v) for v in result["vars_"]]
+        keys = [(var, json.dumps(str(var), ensure_ascii=False)) for var in result["vars_"]]
+        terms = {}  # cada término distinto se serializa una sola vez
+        parts = ['{"head":{"vars":%s},"results":{"bindings":[' % json.dumps(variables, ensure_ascii=False)]
+        rows = 0
+        truncated = False
+        for solution in result["bindings"]:
+            if rows == max_rows:
+                truncated = True
+                break
+            fields = []
+            for var, key in keys:
+                term = solution.get(var)
+                if term is None:
+                    continue
+                encoded = terms.get(term)
+                if encoded is None:
+                    encoded = terms[term] = _term_json(term)
+                fields.append(f"{key}:{encoded}")
+            parts.append(("," if rows else "") + "{" + ",".join(fields) + "}")
+            rows += 1
+            if rows % DEADLINE_CHECK_EVERY == 0:
+                _check_deadline()
+        if truncated:
+            self.stats["truncated"] += 1
+        parts.append(']},"truncated":%s}' % ("true" if truncated else "false"))
+        return "".join(parts)
@@ -1,6 +1,17 @@
-from flask import Flask, request, render_template_string
+from flask import Flask, Response, abort, redirect, request, render_template_string, url_for
 from rdflib import Graph
+from collections import OrderedDict
+import csv
+import hashlib
+import io
 import json
+import threading
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet download is optional
+    pa = pq = None
 
 # ============================================================
 # 1) Load RDF graph (ontology + data WITH links)
@@ -302,6 +313,123 @@ QUERY_EXAMPLES = {
 
 app = Flask(__name__)
 
+# ============================================================
+# 1b) Cached query results: each query runs once, then it is
+#     paged, sorted and downloaded from memory
+# ============================================================
+
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_CACHED_RESULTS = 16
+DOWNLOAD_CHUNK_ROWS = 10000
+
+
+class ResultCache:
+    """Small LRU of query results, keyed by a hash of the query text."""
+
+    def __init__(self, max_entries=MAX_CACHED_RESULTS):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def run(self, query_text):
+        """Run the query (unless it is already cached) and return its key."""
+        key = hashlib.sha1(query_text.strip().encode("utf-8")).hexdigest()[:16]
+        if self.get(key) is not None:
+            return key
+        results = g.query(query_text)
+        entry = {
+            "query": query_text,
+            "headers": [str(v) for v in results.vars],
+            "rows": [tuple(str(c) if c is not None else "" for c in r) for r in results],
+            "orders": {},
+        }
+        with self.lock:
+            self.entries[key] = entry
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return key
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+            return entry
+
+
+results_cache = ResultCache()
+
+
+def sort_order(entry, column, descending):
+    """Row positions sorted by a column (numerically if every non-empty value is a number)."""
+    order = entry["orders"].get((column, descending))
+    if order is not None:
+        return order
+    index = entry["headers"].index(column)
+    values = [row[index] for row in entry["rows"]]
+    try:
+        keys = [float(v) if v != "" else None for v in values]
+    except ValueError:
+        keys = [v if v != "" else None for v in values]
+    filled = sorted((i for i, k in enumerate(keys) if k is not None),
+                    key=keys.__getitem__, reverse=descending)
+    # Empty cells always go last
+    order = filled + [i for i, k in enumerate(keys) if k is None]
+    entry["orders"][(column, descending)] = order
+    return order
+
+
+def iter_csv(entry):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(entry["headers"])
+    rows = entry["rows"]
+    for start in range(0, len(rows), DOWNLOAD_CHUNK_ROWS):
+        writer.writerows(rows[start:start + DOWNLOAD_CHUNK_ROWS])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+class _ParquetSink(io.RawIOBase):
+    """Write-only file that keeps what pyarrow writes until it is drained into the response."""
+
+    def __init__(self):
+        self.pending = bytearray()
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.pending += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = bytes(self.pending)
+        self.pending.clear()
+        return data
+
+
+def iter_parquet(entry):
+    schema = pa.schema([(h, pa.string()) for h in entry["headers"]])
+    sink = _ParquetSink()
+    rows = entry["rows"]
+    with pq.ParquetWriter(sink, schema) as writer:
+        # One row group per chunk, sent as soon as it is written
+        for start in range(0, len(rows), DOWNLOAD_CHUNK_ROWS):
+            chunk = rows[start:start + DOWNLOAD_CHUNK_ROWS]
+            columns = [pa.array([r[i] for r in chunk], pa.string()) for i in range(len(entry["headers"]))]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
 # ============================================================
 # 2) Simple, clean HTML template (query panel arriba, resultados abajo)
 # ============================================================
@@ -503,6 +631,19 @@ HTML_TEMPLATE = """
       max-height: 480px;
       overflow: auto;
     }
+
+    th a, .meta a, .pager a {
+      color: #1d4ed8;
+      text-decoration: none;
+    }
+
+    .pager {
+      display: flex;
+      gap: 12px;
+      margin: 10px 0 0;
+      font-size: 0.8rem;
+      color: #6b7280;
+    }
   </style>
   <script>
     const queries = {{ examples_json | safe }};
@@ -559,12 +700,21 @@ HTML_TEMPLATE = """
       <div class="card results-card">
         <h2>Results</h2>
         {% if headers %}
-          <p class="meta">Returned rows: {{ row_count }}</p>
+          <p class="meta">
+            Returned rows: {{ row_count }}
+            {% if row_count %}· showing {{ first_row }}–{{ last_row }} · page {{ page }} of {{ pages }}{% endif %}
+            · download
+            <a href="{{ url_for('download', key=result_key, fmt='csv') }}">CSV</a>
+            {% if parquet_enabled %}· <a href="{{ url_for('download', key=result_key, fmt='parquet') }}">Parquet</a>{% endif %}
+          </p>
           <table>
             <thead>
               <tr>
                 {% for h in headers %}
-                  <th>{{ h }}</th>
+                  <th>
+                    <a href="{{ page_url(page=1, sort=h, desc=(sort == h and not desc)) }}">{{ h }}</a>
+                    {% if sort == h %}{{ "▼" if desc else "▲" }}{% endif %}
+                  </th>
                 {% endfor %}
               </tr>
             </thead>
@@ -578,6 +728,19 @@ HTML_TEMPLATE = """
               {% endfor %}
             </tbody>
           </table>
+          {% if pages > 1 %}
+            <p class="pager">
+              {% if page > 1 %}
+                <a href="{{ page_url(page=1) }}">« First</a>
+                <a href="{{ page_url(page=page - 1) }}">‹ Previous</a>
+              {% endif %}
+              <span>Page {{ page }} of {{ pages }}</span>
+              {% if page < pages %}
+                <a href="{{ page_url(page=page + 1) }}">Next ›</a>
+                <a href="{{ page_url(page=pages) }}">Last »</a>
+              {% endif %}
+            </p>
+          {% endif %}
         {% else %}
           <p class="meta">
             No results yet. Pick an example above and click <strong>Run query</strong>.
@@ -598,32 +761,85 @@ HTML_TEMPLATE = """
 def index():
     # Default query text
     query_text = DEFAULT_QUERY
-    headers = []
-    rows = []
     error = None
 
     if request.method == "POST":
         query_text = request.form.get("query", "")
         try:
-            results = g.query(query_text)
-            headers = [str(v) for v in results.vars]
-            for r in results:
-                rows.append([str(c) if c is not None else "" for c in r])
+            # Post/redirect/get: pages and sort links reuse the cached result
+            return redirect(url_for("index", result=results_cache.run(query_text)))
         except Exception as e:
             error = str(e)
 
+    result_key = request.args.get("result")
+    entry = results_cache.get(result_key) if result_key else None
+    if result_key and entry is None:
+        error = "This result is no longer cached. Run the query again."
+
+    headers, rows = [], []
+    row_count, page, pages, per_page = 0, 1, 1, PAGE_SIZE
+    sort, desc = None, False
+    if entry is not None:
+        query_text = entry["query"]
+        headers = entry["headers"]
+        row_count = len(entry["rows"])
+        per_page = min(max(request.args.get("per_page", PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+        pages = max(1, -(-row_count // per_page))
+        page = min(max(request.args.get("page", 1, type=int), 1), pages)
+        sort = request.args.get("sort")
+        desc = request.args.get("desc", "false") == "true"
+        start = (page - 1) * per_page
+        if sort in headers:
+            rows = [entry["rows"][i] for i in sort_order(entry, sort, desc)[start:start + per_page]]
+        else:
+            sort = None
+            rows = entry["rows"][start:start + per_page]
+
+    def page_url(**changes):
+        params = {"result": result_key, "page": page, "per_page": per_page, "sort": sort,
+                  "desc": "true" if desc else "false"}
+        params.update(changes)
+        if isinstance(params["desc"], bool):
+            params["desc"] = "true" if params["desc"] else "false"
+        return url_for("index", **{k: v for k, v in params.items() if v is not None})
+
+    first_row = (page - 1) * per_page + 1 if rows else 0
     return render_template_string(
         HTML_TEMPLATE,
         num_triples=len(g),
         query_text=query_text,
         headers=headers,
         rows=rows,
-        row_count=len(rows),
+        row_count=row_count,
+        first_row=first_row,
+        last_row=first_row + len(rows) - 1 if rows else 0,
+        page=page,
+        pages=pages,
+        sort=sort,
+        desc=desc,
+        page_url=page_url,
+        result_key=result_key,
+        parquet_enabled=pq is not None,
         error=error,
         example_names=list(QUERY_EXAMPLES.keys()),
         examples_json=json.dumps(QUERY_EXAMPLES),
     )
 
+
+@app.route("/download/<key>.<fmt>")
+def download(key, fmt):
+    entry = results_cache.get(key)
+    if entry is None:
+        abort(404, "This result is no longer cached. Run the query again.")
+    if fmt == "csv":
+        body, mimetype = iter_csv(entry), "text/csv"
+    elif fmt == "parquet" and pq is not None:
+        body, mimetype = iter_parquet(entry), "application/vnd.apache.parquet"
+    else:
+        abort(404)
+    return Response(body, mimetype=mimetype,
+                    headers={"Content-Disposition": f"attachment; filename=results-{key}.{fmt}"})
+
 # ============================================================
 # 4) Run the app
 # ============================================================